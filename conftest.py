@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_cache():
+    """Тесты pytest тоже работают со своим файлом кэша, а не с общим
+    кэшем сайта: TEST_RUNNER pytest не использует."""
+    from core.test_runner import temporary_cache
+
+    with temporary_cache():
+        yield
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+
+
+def make_cache(backend, directory):
+    locations = {
+        'locmem': 'bench',
+        'filebased': os.path.join(directory, 'files'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }
+    return import_string(BACKENDS[backend])(
+        locations[backend], {'OPTIONS': {'MAX_ENTRIES': 100000}}
+    )
+
+
+def worker(backend, directory, options, barrier, results):
+    """Читает общий набор ключей; при промахе пересчитывает и пишет."""
+    cache = make_cache(backend, directory)
+    random.seed(os.getpid())
+    hits = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for _ in range(options['ops']):
+        key = f'key:{random.randrange(options["keys"])}'
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, 'x' * options['size'])
+        if random.random() < options['incr_share']:
+            if not cache.add('counter', 1):
+                cache.incr('counter')
+    results.put((time.perf_counter() - started, hits))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMem, FileBased и SQLite кэши под нагрузкой '
+        'из нескольких процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=2000)
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument('--size', type=int, default=2048)
+        parser.add_argument('--incr-share', type=float, default=0.05)
+        parser.add_argument(
+            '--backend',
+            choices=BACKENDS,
+            action='append',
+            help='Можно указать несколько раз, по умолчанию все.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"бэкенд":<10} {"операций/с":>12} {"попаданий":>10} '
+            f'{"incr виден всем":>16}'
+        )
+        for backend in options['backend'] or BACKENDS:
+            with tempfile.TemporaryDirectory() as directory:
+                ops_per_second, hit_ratio, shared = self.run_backend(
+                    backend, directory, options
+                )
+            self.stdout.write(
+                f'{backend:<10} {ops_per_second:>12.0f} '
+                f'{hit_ratio:>10.1%} {"да" if shared else "нет":>16}'
+            )
+
+    def run_backend(self, backend, directory, options):
+        barrier = multiprocessing.Barrier(options['processes'])
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=worker,
+                args=(backend, directory, options, barrier, results),
+            )
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        measurements = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        elapsed = max(seconds for seconds, _ in measurements)
+        total = options['ops'] * options['processes']
+        hits = sum(hit for _, hit in measurements)
+        increments = make_cache(backend, directory).get('counter') or 0
+        return total / elapsed, hits / total, increments > 0
@@ -0,0 +1,37 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_cache():
+    """Подменяет файл кэша на временный.
+
+    Тесты сбрасывают кэш, а файловый кэш из настроек общий для всех
+    процессов сайта на хосте. Используется и manage.py test,
+    и pytest через conftest.py в корне репозитория.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        location = os.path.join(directory, 'cache.sqlite3')
+        with override_settings(CACHES={
+            **settings.CACHES,
+            'default': {**settings.CACHES['default'], 'LOCATION': location},
+        }):
+            yield
+
+
+class TempCacheRunner(DiscoverRunner):
+    """Запускает тесты с кэшем во временном каталоге."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache = temporary_cache()
+        self.cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -1,7 +1,18 @@
+import multiprocessing
+import os
+import tempfile
 from http import HTTPStatus
+from time import time
+from unittest import mock
 
+from django.conf import settings
+from django.core.cache import caches
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+
+from .cache import SQLiteCache
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -19,3 +30,106 @@ class ViewTestClass(TestCase):
         response = self.authorized_client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def _incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 3}}
+        )
+
+    def test_set_get_and_ttl(self):
+        self.cache.set('key', {'value': 1}, timeout=60)
+        self.cache.set('short', 'value', timeout=60)
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        with mock.patch('core.cache.time.time', return_value=time() + 61):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertTrue(self.cache.add('short', 'new'))
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные ключи."""
+        with mock.patch('core.cache.time.time') as clock:
+            for number, key in enumerate(('a', 'b', 'c')):
+                clock.return_value = 1000 + number * 10
+                self.cache.set(key, key, timeout=None)
+            clock.return_value = 1100
+            self.cache.get('a')
+            self.cache.set('d', 'd', timeout=None)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertEqual(self.cache.get('d'), 'd')
+
+    def test_overflow_checked_every_few_writes(self):
+        """Число записей считается раз в сотую долю MAX_ENTRIES."""
+        cache = SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 1000}})
+        with mock.patch.object(
+            SQLiteCache, '_count', autospec=True, return_value=0
+        ) as count:
+            for number in range(100):
+                cache.set(f'key{number}', number)
+        self.assertEqual(count.call_count, 10)
+
+    def test_tests_use_own_cache(self):
+        """Тесты не сбрасывают общий кэш работающего сайта."""
+        self.assertNotEqual(
+            caches['default']._path,
+            os.path.join(settings.BASE_DIR, 'cache.sqlite3'),
+        )
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(
+                target=_incr_many, args=(self.location, 50)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_identical_files_share_name(self):
+        first = self.storage.save('posts/a.JPG', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(self.storage.is_hashed(first))
+        self.assertRegex(first, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.jpg$')
+        self.assertEqual(len(self.storage.listdir(
+            os.path.dirname(first))[1]), 1)
+
+    def test_duplicate_refreshes_mtime(self):
+        """Повторная загрузка освежает время изменения файла."""
+        name = self.storage.save('posts/a.jpg', ContentFile(b'picture'))
+        os.utime(self.storage.path(name), (0, 0))
+        self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        self.assertGreater(
+            os.path.getmtime(self.storage.path(name)), time() - 60)
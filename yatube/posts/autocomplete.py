@@ -0,0 +1,160 @@
+import threading
+from bisect import bisect_left
+
+from . import caching
+from .constants import AUTOCOMPLETE_CHANGE_TIMEOUT, AUTOCOMPLETE_LIMIT
+from .models import Group, User
+
+user_changes = caching.ChangeLog('users', AUTOCOMPLETE_CHANGE_TIMEOUT)
+GROUPS_SCOPE = 'autocomplete:groups'
+# Разделитель ключа и значения меньше любого другого символа, поэтому
+# элементы с общим префиксом ключа лежат в массиве подряд.
+SEPARATOR = '\0'
+
+
+class PrefixIndex:
+    """Отсортированный массив строк «ключ\\0значение».
+
+    Поиск по началу ключа — двоичный поиск первого подходящего
+    элемента и проход по соседним, то есть O(log n + limit).
+    Ключи сравниваются без учёта регистра.
+    """
+
+    def __init__(self, pairs=()):
+        self.entries = sorted(self.entry(key, value) for key, value in pairs)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def entry(key, value):
+        return f'{key.lower()}{SEPARATOR}{value}'
+
+    def add(self, key, value):
+        entry = self.entry(key, value)
+        position = bisect_left(self.entries, entry)
+        if self.entries[position:position + 1] != [entry]:
+            self.entries.insert(position, entry)
+
+    def remove(self, key, value):
+        entry = self.entry(key, value)
+        position = bisect_left(self.entries, entry)
+        if self.entries[position:position + 1] == [entry]:
+            del self.entries[position]
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """Значения, ключ которых начинается с prefix, без повторов."""
+        prefix = prefix.lower().replace(SEPARATOR, '')
+        entries = self.entries
+        found = []
+        position = bisect_left(entries, prefix)
+        while position < len(entries) and len(found) < limit:
+            entry = entries[position]
+            if not entry.startswith(prefix):
+                break
+            value = entry.partition(SEPARATOR)[2]
+            if value not in found:
+                found.append(value)
+            position += 1
+        return found
+
+
+class UserIndex:
+    """Имена пользователей в памяти процесса.
+
+    Индекс один раз строится из таблицы пользователей, а дальше
+    процесс дочитывает из журнала в общем кэше пары (старое имя,
+    новое имя), которые пишут сигналы, и переносит только эти имена.
+    Если записи журнала потерялись, индекс строится заново.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.applied = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        number = user_changes.last()
+        if number != self.applied:
+            with self.lock:
+                if number != self.applied:
+                    self.sync(number)
+        return self.index
+
+    def sync(self, number):
+        found = None
+        if self.index is not None:
+            found = user_changes.read(self.applied, number)
+        if found is None:
+            self.rebuild()
+        else:
+            for old_username, username in found:
+                if old_username:
+                    self.index.remove(old_username, old_username)
+                if username:
+                    self.index.add(username, username)
+        self.applied = number
+
+    def rebuild(self):
+        # Изменения, записанные во время чтения, применятся повторно,
+        # а add и remove к этому устойчивы.
+        self.index = PrefixIndex(
+            (username, username)
+            for username in User.objects.order_by().values_list(
+                'username', flat=True
+            ).iterator()
+        )
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        return [
+            {'username': username}
+            for username in self.get().search(prefix, limit)
+        ]
+
+
+def record_user_change(old_username, username):
+    """Пишет в журнал после коммита, что имя old_username пропало,
+    а username появилось; любое из них может быть None."""
+    user_changes.append_on_commit((old_username, username))
+
+
+class GroupIndex:
+    """Группы по названию и адресу в памяти процесса.
+
+    Групп немного, поэтому после любого изменения индекс строится
+    заново.
+    """
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        generation = caching.get_generation(GROUPS_SCOPE)
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    self.rebuild()
+                    self.generation = generation
+        return self.index
+
+    def rebuild(self):
+        # Значение хранит и адрес, и название, чтобы ответ собирался
+        # из одного индекса.
+        self.index = PrefixIndex(
+            (key, f'{slug}{SEPARATOR}{title}')
+            for slug, title in Group.objects.values_list('slug', 'title')
+            for key in (title, slug)
+        )
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        found = []
+        for value in self.get().search(prefix, limit):
+            slug, _, title = value.partition(SEPARATOR)
+            found.append({'slug': slug, 'title': title})
+        return found
+
+
+users = UserIndex()
+groups = GroupIndex()
@@ -0,0 +1,235 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .constants import (
+    CHANGE_LOG_READ_LIMIT,
+    FEED_CACHE_TIMEOUT,
+    PAGE_CACHE_FRESH,
+    PAGE_CACHE_LOCK_TIMEOUT,
+    PAGE_CACHE_STALE,
+)
+
+CHANGE_KEY = 'posts:change:{}:{}'
+GENERATION_KEY = 'posts:generation:{}'
+PAGE_KEY = 'posts:page:{}'
+PAGE_LOCK_KEY = 'posts:page-lock:{}'
+POSTS_SCOPE = 'posts'
+
+
+def author_scope(user_id):
+    return f'author:{user_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id, **kwargs):
+    return f'post:{post_id}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def get_generation(scope=POSTS_SCOPE):
+    """Текущее поколение области кэша.
+
+    Начальное значение берётся из часов, поэтому после вытеснения
+    счётчика старые фрагменты не совпадут с новыми ключами.
+    """
+    key = GENERATION_KEY.format(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_generations(scopes):
+    """Поколения нескольких областей одним get_many."""
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    return {
+        scope: found[key] if key in found else get_generation(scope)
+        for key, scope in keys.items()
+    }
+
+
+def bump_generation(scope=POSTS_SCOPE):
+    """Делает недействительными все фрагменты области."""
+    key = GENERATION_KEY.format(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump_on_commit(*scopes):
+    """Сдвигает поколения областей после коммита текущей транзакции.
+
+    Внутри транзакции поколения сдвигаются ещё и сразу, чтобы её
+    собственные чтения не брали старый кэш. Сдвиг после коммита
+    сбрасывает то, что другой процесс успел закэшировать по данным,
+    в которых изменений ещё не видно.
+    """
+    def bump():
+        for scope in scopes:
+            bump_generation(scope)
+
+    if transaction.get_connection().in_atomic_block:
+        bump()
+    transaction.on_commit(bump)
+
+
+class ChangeLog:
+    """Журнал изменений в общем кэше, по которому процессы обновляют
+    свои индексы в памяти.
+
+    Номер последней записи хранится как поколение области журнала.
+    Запись сначала занимает следующий свободный номер через add и только
+    потом учитывается в счётчике, поэтому все номера до счётчика уже
+    записаны, а пропуск означает, что запись вытеснена.
+    """
+
+    def __init__(self, name, timeout):
+        self.scope = f'log:{name}'
+        self.name = name
+        self.timeout = timeout
+
+    def last(self):
+        return get_generation(self.scope)
+
+    def append(self, change):
+        number = self.last() + 1
+        while not cache.add(
+            CHANGE_KEY.format(self.name, number), change, self.timeout
+        ):
+            number += 1
+        bump_generation(self.scope)
+
+    def append_on_commit(self, change):
+        """Пишет изменение после коммита: иначе процесс, который
+        перестраивает индекс по базе, не увидит его строки, но будет
+        считать его применённым."""
+        transaction.on_commit(lambda: self.append(change))
+
+    def read(self, after, until):
+        """Изменения с номерами после after до until включительно
+        или None, если часть из них уже вытеснена или журнал начался
+        заново."""
+        if not 0 <= until - after <= CHANGE_LOG_READ_LIMIT:
+            return None
+        keys = [
+            CHANGE_KEY.format(self.name, number)
+            for number in range(after + 1, until + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return [changes[key] for key in keys]
+
+
+def get_cache_context(*scopes):
+    """Контекст для тега {% cache %}: время жизни и ключ поколения."""
+    scopes = scopes or (POSTS_SCOPE,)
+    return {
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'cache_generation': '-'.join(
+            str(get_generation(scope)) for scope in scopes
+        ),
+    }
+
+
+def scopes_generation(scopes, kwargs):
+    """Общее поколение областей; функции получают аргументы view."""
+    return '-'.join(
+        str(get_generation(scope(**kwargs) if callable(scope) else scope))
+        for scope in scopes
+    )
+
+
+def conditional_page(*scopes):
+    """Отвечает 304 Not Modified, если поколения областей не менялись.
+
+    ETag строится из счётчиков поколений в кэше, пользователя и токена
+    CSRF, поэтому для проверки не нужны ни запросы к базе, ни рендеринг,
+    а после нового входа формы на странице не останутся со старым
+    токеном. Устаревшая копия из cache_anonymous_page отдаётся без ETag:
+    иначе клиент получал бы на неё 304 и после перестройки страницы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            validator = ':'.join((
+                scopes_generation(scopes, kwargs),
+                str(request.user.pk),
+                request.META.get('CSRF_COOKIE', ''),
+            ))
+            etag = quote_etag(hashlib.md5(validator.encode()).hexdigest())
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if not getattr(response, 'stale', False):
+                    response.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_anonymous_page(*scopes):
+    """Кэширует страницу целиком для анонимных пользователей.
+
+    Запись считается устаревшей по истечении PAGE_CACHE_FRESH или когда
+    меняется поколение одной из областей scopes (строки или функции
+    от аргументов view). Устаревшую страницу перестраивает только
+    запрос, взявший блокировку, остальные получают старую копию.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+
+            path = request.get_full_path()
+            key = PAGE_KEY.format(path)
+            generation = scopes_generation(scopes, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                cached_generation, fresh_until, response = entry
+                if (cached_generation == generation
+                        and fresh_until > time.time()):
+                    return response
+                lock_key = PAGE_LOCK_KEY.format(path)
+                if not cache.add(lock_key, 1, PAGE_CACHE_LOCK_TIMEOUT):
+                    response.stale = True
+                    return response
+                try:
+                    return _render_page(
+                        view, request, args, kwargs, key, generation
+                    )
+                finally:
+                    cache.delete(lock_key)
+            return _render_page(view, request, args, kwargs, key, generation)
+        return wrapper
+    return decorator
+
+
+def _render_page(view, request, args, kwargs, key, generation):
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200 and not response.cookies:
+        cache.set(
+            key,
+            (generation, time.time() + PAGE_CACHE_FRESH, response),
+            PAGE_CACHE_FRESH + PAGE_CACHE_STALE,
+        )
+    return response
@@ -0,0 +1,79 @@
+from django.utils.http import int_to_base36
+
+from .constants import (
+    COMMENT_MAX_DEPTH, COMMENT_PATH_STEP, COMMENT_REPLIES_PER_PAGE,
+)
+from .models import Comment
+
+# Больше любой цифры base36: пути потомков лежат между путём ветки
+# и путём с этим символом на конце.
+PATH_END = '~'
+
+
+def path_segment(pk):
+    return int_to_base36(pk).rjust(COMMENT_PATH_STEP, '0')
+
+
+def thread_bounds(path):
+    """Границы путей потомков комментария, не включая его самого."""
+    return path, path + PATH_END
+
+
+def reply_parent(parent):
+    """Комментарий, к которому прикрепится ответ на parent.
+
+    Ответ на самый глубокий уровень попадает к родителю parent,
+    чтобы глубина веток оставалась ограниченной.
+    """
+    if parent.depth >= COMMENT_MAX_DEPTH:
+        return parent.parent
+    return parent
+
+
+def attach_replies(roots, limit=COMMENT_REPLIES_PER_PAGE):
+    """Подгружает первые limit ответов каждой ветки одним запросом.
+
+    Ответы кладутся в root.thread_replies в порядке путей, то есть
+    обходом дерева в глубину; root.has_more_replies показывает, есть ли
+    в ветке ещё ответы.
+    """
+    roots = list(roots)
+    for root in roots:
+        root.thread_replies = []
+        root.has_more_replies = False
+    if not roots:
+        return
+    table = Comment._meta.db_table
+    ranges = ' OR '.join(['(path > %s AND path < %s)'] * len(roots))
+    params = [COMMENT_PATH_STEP, roots[0].post_id]
+    for root in roots:
+        params.extend(thread_bounds(root.path))
+    # Подзапрос не через pk__in=RawSQL: Django обернёт его в лишние
+    # скобки, и SQLite вернёт из него только первую строку.
+    ids = (
+        f'{table}.id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+        f'PARTITION BY substr(path, 1, %s) ORDER BY path) AS number '
+        f'FROM {table} WHERE post_id = %s AND ({ranges})) '
+        f'WHERE number <= %s)'
+    )
+    by_path = {root.path: root for root in roots}
+    for reply in Comment.objects.extra(
+        where=[ids], params=params + [limit + 1]
+    ).select_related('author').order_by('path'):
+        root = by_path[reply.path[:COMMENT_PATH_STEP]]
+        if len(root.thread_replies) < limit:
+            root.thread_replies.append(reply)
+        else:
+            root.has_more_replies = True
+
+
+def get_replies(root, after='', limit=COMMENT_REPLIES_PER_PAGE):
+    """Следующие limit ответов ветки root после пути after.
+
+    Возвращает ответы и признак, что в ветке есть ещё.
+    """
+    start, end = thread_bounds(root.path)
+    replies = list(Comment.objects.filter(
+        post_id=root.post_id, path__gt=max(start, after), path__lt=end
+    ).select_related('author').order_by('path')[:limit + 1])
+    return replies[:limit], len(replies) > limit
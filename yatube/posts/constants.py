@@ -1,2 +1,43 @@
 AMOUNT_PUBLICATION = 10
 LEN_TEXT = 15
+COMMENTS_PER_PAGE = 20
+# Ответы глубже последнего уровня становятся ответами на его родителя.
+COMMENT_MAX_DEPTH = 4
+# Ответов в ветке до кнопки «Показать ещё ответы».
+COMMENT_REPLIES_PER_PAGE = 5
+# Ширина звена пути комментария: id в base36 с ведущими нулями.
+COMMENT_PATH_STEP = 8
+TAG_MAX_LENGTH = 50
+# Популярные теги считаются по постам за последние столько часов.
+TRENDING_WINDOW_HOURS = 24
+TRENDING_LIMIT = 10
+TIMELINE_BATCH_SIZE = 1000
+FOLLOW_SUGGESTIONS_LIMIT = 5
+FOLLOW_GRAPH_CHANGE_TIMEOUT = 60 * 60 * 24
+# Процесс, отставший от журнала изменений больше чем на столько
+# записей, строит свой индекс заново.
+CHANGE_LOG_READ_LIMIT = 10_000
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+PAGE_CACHE_FRESH = 60 * 10
+PAGE_CACHE_STALE = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+POST_FRAGMENT_TIMEOUT = 60 * 60 * 24
+# Миниатюры, которые используют шаблоны постов: в ленте и на странице
+# поста. Для каждой строятся варианты всех ширин и форматов ниже.
+THUMBNAIL_SIZES = {
+    'list': ('1280x840', {'crop': 'center', 'upscale': True}),
+    'detail': ('1280x840', {'upscale': True}),
+}
+THUMBNAIL_WIDTHS = (480, 960, 1280)
+# Форматы, которые не поддерживает установленный Pillow, пропускаются.
+# Последний формат служит запасным для <img>.
+THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+# Размытое превью, которое встраивается в страницу до загрузки картинки.
+IMAGE_PLACEHOLDER_SIZE = (16, 16)
+IMAGE_PLACEHOLDER_QUALITY = 50
+# Форматы, которые пережимаются при загрузке; GIF остаётся как есть,
+# чтобы не потерять анимацию.
+OPTIMIZED_IMAGE_FORMATS = ('JPEG', 'PNG')
+# Подсказок в ответе автодополнения.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_CHANGE_TIMEOUT = 60 * 60 * 24
@@ -1,5 +1,6 @@
 from django import forms
 
+from .images import validate_image
 from .models import Post, Comment
 
 
@@ -8,6 +9,10 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image'].validators.append(validate_image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,252 @@
+import heapq
+import logging
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+from .caching import ChangeLog
+from .constants import FOLLOW_GRAPH_CHANGE_TIMEOUT, FOLLOW_SUGGESTIONS_LIMIT
+from .models import Follow, User
+
+logger = logging.getLogger(__name__)
+
+changes = ChangeLog('graph', FOLLOW_GRAPH_CHANGE_TIMEOUT)
+# Заголовок снимка: номер журнала и длины массивов offsets и targets.
+SNAPSHOT_HEADER = struct.Struct('<qqq')
+
+
+class FollowGraph:
+    """Граф подписок в формате CSR.
+
+    Индекс вершины — id пользователя: его подписки лежат в
+    targets[offsets[id]:offsets[id + 1]] по возрастанию id авторов.
+    Подписки и отписки после построения копятся в словарях added
+    и removed до следующего снимка или compact.
+    """
+
+    def __init__(self, offsets=None, targets=None):
+        self.offsets = offsets if offsets is not None else array('q', [0])
+        self.targets = targets if targets is not None else array('i')
+        self.added = {}
+        self.removed = {}
+        self.changes = 0
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Строит граф из пар (читатель, автор), упорядоченных
+        по читателю и автору, за один проход."""
+        offsets = array('q', [0])
+        targets = array('i')
+        for user, author in edges:
+            while len(offsets) <= user:
+                offsets.append(len(targets))
+            targets.append(author)
+        offsets.append(len(targets))
+        return cls(offsets, targets)
+
+    @property
+    def nbytes(self):
+        """Память под массивы CSR, без словарей изменений."""
+        return (
+            self.offsets.itemsize * len(self.offsets)
+            + self.targets.itemsize * len(self.targets)
+        )
+
+    def _row(self, user):
+        if user + 1 >= len(self.offsets):
+            return 0, 0
+        return self.offsets[user], self.offsets[user + 1]
+
+    def _in_row(self, user, author):
+        start, end = self._row(user)
+        position = bisect_left(self.targets, author, start, end)
+        return position < end and self.targets[position] == author
+
+    def following(self, user):
+        start, end = self._row(user)
+        authors = self.targets[start:end]
+        added = self.added.get(user)
+        removed = self.removed.get(user)
+        if not added and not removed:
+            return authors
+        if removed:
+            authors = [author for author in authors if author not in removed]
+        return list(authors) + sorted(added or ())
+
+    def follow(self, user, author):
+        if author in self.removed.get(user, ()):
+            self.removed[user].discard(author)
+        elif not self._in_row(user, author):
+            self.added.setdefault(user, set()).add(author)
+        self._changed()
+
+    def unfollow(self, user, author):
+        if author in self.added.get(user, ()):
+            self.added[user].discard(author)
+        elif self._in_row(user, author):
+            self.removed.setdefault(user, set()).add(author)
+        self._changed()
+
+    def _changed(self):
+        self.changes += 1
+
+    def apply(self, user, author, followed):
+        if followed:
+            self.follow(user, author)
+        else:
+            self.unfollow(user, author)
+
+    def edges(self):
+        for user in range(len(self.offsets) - 1):
+            for author in sorted(self.following(user)):
+                yield user, author
+        for user in sorted(self.added):
+            if user + 1 >= len(self.offsets):
+                for author in sorted(self.added[user]):
+                    yield user, author
+
+    def compact(self):
+        """Переносит накопленные изменения в массивы CSR."""
+        graph = self.from_edges(self.edges())
+        self.offsets, self.targets = graph.offsets, graph.targets
+        self.added, self.removed = {}, {}
+        self.changes = 0
+
+    def suggest(self, user, limit=FOLLOW_SUGGESTIONS_LIMIT):
+        """Пары (id, число общих подписок) для «кого почитать».
+
+        Кандидаты — авторы, на которых подписаны авторы из подписок
+        user; чем больше таких подписок, тем выше кандидат. Стоимость —
+        сумма числа подписок у авторов, которых читает user.
+        """
+        followed = self.following(user)
+        counts = Counter()
+        for author in followed:
+            counts.update(self.following(author))
+        for excluded in (user, *followed):
+            counts.pop(excluded, None)
+        return heapq.nlargest(
+            limit, counts.items(), key=lambda item: (item[1], -item[0])
+        )
+
+
+def record_change(user_id, author_id, followed):
+    """Пишет подписку или отписку в журнал изменений после коммита,
+    откуда её заберут графы всех процессов."""
+    changes.append_on_commit((user_id, author_id, followed))
+
+
+def save_snapshot(graph, number, path):
+    """Пишет массивы CSR в файл; файл заменяется целиком, поэтому
+    процессы не прочитают его наполовину записанным."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(
+            number, len(graph.offsets), len(graph.targets)
+        ))
+        graph.offsets.tofile(file)
+        graph.targets.tofile(file)
+    os.replace(temporary, path)
+
+
+def load_snapshot(path):
+    """Граф и номер журнала, на котором снят снимок."""
+    with open(path, 'rb') as file:
+        number, offsets_length, targets_length = SNAPSHOT_HEADER.unpack(
+            file.read(SNAPSHOT_HEADER.size)
+        )
+        offsets = array('q')
+        offsets.fromfile(file, offsets_length)
+        targets = array('i')
+        targets.fromfile(file, targets_length)
+    return FollowGraph(offsets, targets), number
+
+
+def build_snapshot(path):
+    """Строит граф по таблице Follow и сохраняет снимок.
+
+    Номер журнала берётся до чтения таблицы: изменения, записанные
+    во время чтения, применятся повторно, а follow и unfollow к этому
+    устойчивы.
+    """
+    number = changes.last()
+    graph = FollowGraph.from_edges(
+        Follow.objects.order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id'
+        ).iterator()
+    )
+    save_snapshot(graph, number, path)
+    return graph
+
+
+class GraphService:
+    """Граф подписок в памяти процесса.
+
+    Граф строится вне запросов командой build_follow_graph, процесс
+    только загружает готовый снимок FOLLOW_GRAPH_SNAPSHOT и дочитывает
+    изменения из журнала в кэше. Пока снимка нет, подсказок нет. Если
+    записи журнала потерялись, граф обходится без них до следующего
+    снимка: перестраивать его в запросе слишком дорого.
+    """
+
+    def __init__(self):
+        self.graph = None
+        self.applied = 0
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        path = settings.FOLLOW_GRAPH_SNAPSHOT
+        try:
+            snapshot = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            snapshot = self.snapshot
+        number = changes.last()
+        stale = snapshot != self.snapshot or number != self.applied
+        # Пока один запрос обновляет граф, остальные читают прежний.
+        if stale and self.lock.acquire(blocking=False):
+            try:
+                if snapshot != self.snapshot:
+                    self.graph, self.applied = load_snapshot(path)
+                    self.snapshot = snapshot
+                if self.graph is not None:
+                    self.sync(number)
+            finally:
+                self.lock.release()
+        return self.graph
+
+    def sync(self, number):
+        found = changes.read(self.applied, number)
+        if found is None:
+            logger.warning(
+                'Журнал подписок прочитан не полностью (%s → %s), '
+                'граф обновится со следующим снимком.',
+                self.applied, number,
+            )
+        else:
+            for change in found:
+                self.graph.apply(*change)
+        self.applied = number
+
+    def suggest_users(self, user, limit=FOLLOW_SUGGESTIONS_LIMIT):
+        """Пользователи для «кого почитать» с числом общих подписок
+        в атрибуте mutual_count."""
+        graph = self.get()
+        if graph is None:
+            return []
+        suggestions = graph.suggest(user.pk, limit)
+        users = User.objects.in_bulk([pk for pk, _ in suggestions])
+        found = []
+        for pk, mutual_count in suggestions:
+            if pk in users:
+                users[pk].mutual_count = mutual_count
+                found.append(users[pk])
+        return found
+
+
+graph = GraphService()
@@ -0,0 +1,184 @@
+import base64
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+from .constants import (
+    IMAGE_PLACEHOLDER_QUALITY,
+    IMAGE_PLACEHOLDER_SIZE,
+    OPTIMIZED_IMAGE_FORMATS,
+)
+
+logger = logging.getLogger(__name__)
+
+EXIF_ORIENTATION = 0x0112
+# Сегменты JPEG с метаданными: EXIF и XMP, IPTC, комментарий.
+# Цветовой профиль (APP2) и APP14 Adobe с цветовым пространством нужны
+# для отображения и остаются.
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+JPEG_START_OF_SCAN = 0xDA
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'eXIf', b'tIME'}
+PNG_SIGNATURE_LENGTH = 8
+
+
+def validate_image(file):
+    """Отклоняет слишком тяжёлые картинки.
+
+    Вызывается после ImageField.to_python, который открывает картинку
+    лениво: размеры уже прочитаны из заголовка, пиксели — ещё нет.
+    """
+    if file.size > settings.POSTS_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POSTS_IMAGE_MAX_BYTES)},
+        )
+    width, height = file.image.size
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка %(width)s×%(height)s больше %(limit)s Мп.',
+            code='too_many_pixels',
+            params={
+                'width': width,
+                'height': height,
+                'limit': settings.POSTS_IMAGE_MAX_PIXELS // 10 ** 6,
+            },
+        )
+
+
+def optimize(file):
+    """Поворачивает картинку по EXIF, уменьшает до
+    POSTS_IMAGE_MAX_DIMENSION по большей стороне и пережимает
+    без метаданных.
+
+    Если ни поворот, ни уменьшение не нужны, а пережатый файл
+    не меньше исходного, остаются исходные байты без метаданных.
+    Возвращает новый файл или None, если картинку лучше оставить
+    как есть: анимацию, незнакомый формат, нечитаемый файл или файл,
+    в котором нечего менять.
+    """
+    limit = settings.POSTS_IMAGE_MAX_DIMENSION
+    before = file.size
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format = image.format
+            if (
+                image_format not in OPTIMIZED_IMAGE_FORMATS
+                or getattr(image, 'is_animated', False)
+            ):
+                return None
+            transformed = (
+                max(image.size) > limit
+                or image.getexif().get(EXIF_ORIENTATION, 1) != 1
+            )
+            icc_profile = image.info.get('icc_profile')
+            # JPEG раскодируется сразу в уменьшенном масштабе.
+            image.draft(image.mode, (limit, limit))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((limit, limit), Image.LANCZOS)
+            buffer = io.BytesIO()
+            # Метаданные, кроме цветового профиля, не сохраняются.
+            options = {
+                'optimize': True, 'icc_profile': icc_profile, 'exif': b'',
+            }
+            if image_format == 'JPEG':
+                options.update(
+                    quality=settings.POSTS_IMAGE_QUALITY, progressive=True
+                )
+            image.save(buffer, image_format, **options)
+        content = buffer.getvalue()
+        if not transformed:
+            file.seek(0)
+            stripped = strip_metadata(file.read(), image_format)
+            if len(stripped) <= len(content):
+                if len(stripped) == before:
+                    return None
+                content = stripped
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    finally:
+        file.seek(0)
+    logger.info(
+        'Картинка %s пережата: %s → %s байт',
+        file.name, before, len(content),
+    )
+    return ContentFile(content, os.path.basename(file.name))
+
+
+def strip_metadata(data, image_format):
+    """Байты JPEG или PNG без сегментов с метаданными, без пережатия.
+
+    Неожиданная структура файла даёт ValueError.
+    """
+    if image_format == 'JPEG':
+        return _strip_jpeg(data)
+    return _strip_png(data)
+
+
+def _strip_jpeg(data):
+    parts = [data[:2]]
+    position = 2
+    while True:
+        if position + 4 > len(data) or data[position] != 0xFF:
+            raise ValueError('Ожидался маркер JPEG.')
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Байты-заполнители между сегментами.
+            position += 1
+            continue
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        end = position + 2 + length
+        if marker == JPEG_START_OF_SCAN:
+            # Дальше сжатые данные до конца файла.
+            parts.append(data[position:])
+            return b''.join(parts)
+        if marker not in JPEG_METADATA_MARKERS:
+            parts.append(data[position:end])
+        position = end
+
+
+def _strip_png(data):
+    parts = [data[:PNG_SIGNATURE_LENGTH]]
+    position = PNG_SIGNATURE_LENGTH
+    while position < len(data):
+        length = int.from_bytes(data[position:position + 4], 'big')
+        kind = data[position + 4:position + 8]
+        # Длина, тип, данные и контрольная сумма.
+        end = position + 12 + length
+        if end > len(data):
+            raise ValueError('Обрезанный блок PNG.')
+        if kind not in PNG_METADATA_CHUNKS:
+            parts.append(data[position:end])
+        position = end
+    return b''.join(parts)
+
+
+def describe(file):
+    """Ширина, высота и data URI крошечного превью картинки.
+
+    Для файла, который не удалось прочитать, возвращает (None, None, '').
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+            if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+                return width, height, ''
+            image.draft('RGB', IMAGE_PLACEHOLDER_SIZE)
+            preview = image.convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None, None, ''
+    finally:
+        file.seek(0)
+    preview.thumbnail(IMAGE_PLACEHOLDER_SIZE)
+    buffer = io.BytesIO()
+    preview.save(buffer, 'JPEG', quality=IMAGE_PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return width, height, f'data:image/jpeg;base64,{encoded}'
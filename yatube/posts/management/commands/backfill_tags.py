@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.models import Post, PostTag
+
+
+class Command(BaseCommand):
+    help = 'Заполняет индекс тегов по текстам уже опубликованных постов.'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(text__contains='#').only(
+            'pk', 'text', 'pub_date'
+        )
+        processed = 0
+        for post in posts.iterator():
+            with transaction.atomic():
+                tags.sync_tags(post)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано постов с тегами: {processed}, '
+            f'связей с тегами: {PostTag.objects.count()}'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты подписок по таблице Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Очистить ленты перед заполнением.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            deleted, _ = TimelineEntry.objects.all().delete()
+            self.stdout.write(f'Удалено записей ленты: {deleted}')
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        processed = 0
+        for user_id, author_id in follows.iterator():
+            with transaction.atomic():
+                timeline.add_author(user_id, author_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {processed}, '
+            f'записей в лентах: {TimelineEntry.objects.count()}'
+        ))
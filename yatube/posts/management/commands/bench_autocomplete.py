@@ -0,0 +1,59 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.autocomplete import PrefixIndex
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет поиск по префиксу в индексе подсказок на синтетических '
+        'именах пользователей; база не используется.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        alphabet = string.ascii_letters + string.digits + '_'
+        names = [
+            ''.join(random.choices(alphabet, k=random.randint(4, 16)))
+            for _ in range(options['users'])
+        ]
+
+        started = time.perf_counter()
+        index = PrefixIndex((name, name) for name in names)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        for name in random.sample(names, min(1000, len(names))):
+            index.add(name, f'{name}_new')
+        add_us = (time.perf_counter() - started) * 1e6 / min(1000, len(names))
+
+        timings = []
+        for _ in range(options['queries']):
+            name = random.choice(names)
+            prefix = name[:random.randint(1, 4)]
+            started = time.perf_counter_ns()
+            index.search(prefix)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+        timings.sort()
+
+        self.stdout.write(
+            f'Имён: {len(index)}, построение: {build_ms:.0f} мс, '
+            f'добавление: {add_us:.1f} мкс'
+        )
+        self.stdout.write(
+            f'Поиск, мкс: p50 {percentile(timings, 0.5):.1f}, '
+            f'p99 {percentile(timings, 0.99):.1f}, '
+            f'max {timings[-1]:.1f}'
+        )
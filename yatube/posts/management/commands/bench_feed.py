@@ -0,0 +1,117 @@
+import random
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import stats, timeline
+from posts.constants import AMOUNT_PUBLICATION
+from posts.models import Follow, Post, TimelineEntry, User
+
+STRATEGIES = ('push', 'pull', 'hybrid')
+DISTRIBUTIONS = ('uniform', 'zipf', 'celebrity')
+
+
+def pick_authors(authors, distribution, follows_per_user):
+    """Выбирает авторов для одного читателя по заданному распределению."""
+    if distribution == 'uniform':
+        return random.sample(authors, follows_per_user)
+    if distribution == 'celebrity':
+        return [authors[0]] + random.sample(
+            authors[1:], follows_per_user - 1
+        )
+    weights = [1 / rank for rank in range(1, len(authors) + 1)]
+    chosen = set()
+    while len(chosen) < follows_per_user:
+        chosen.update(random.choices(authors, weights, k=follows_per_user))
+    return list(chosen)[:follows_per_user]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок в режимах push, pull и hybrid '
+        'на синтетических данных. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=3)
+        parser.add_argument('--reads', type=int, default=100)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Порог подписчиков для hybrid, по умолчанию users // 10.',
+        )
+        parser.add_argument(
+            '--distribution',
+            choices=DISTRIBUTIONS,
+            action='append',
+            help='Можно указать несколько раз, по умолчанию все.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        limit = options['limit'] or options['users'] // 10
+        limits = {'push': sys.maxsize, 'pull': -1, 'hybrid': limit}
+        self.stdout.write(
+            f'{"распределение":<12} {"режим":<7} {"строк ленты":>12} '
+            f'{"запись, мс/пост":>16} {"чтение, мс":>11}'
+        )
+        for distribution in options['distribution'] or DISTRIBUTIONS:
+            for strategy in STRATEGIES:
+                random.seed(options['seed'])
+                with override_settings(FEED_FANOUT_LIMIT=limits[strategy]):
+                    rows, write_ms, read_ms = self.run_case(
+                        distribution, options
+                    )
+                self.stdout.write(
+                    f'{distribution:<12} {strategy:<7} {rows:>12} '
+                    f'{write_ms:>16.3f} {read_ms:>11.3f}'
+                )
+
+    @transaction.atomic
+    def run_case(self, distribution, options):
+        """Строит данные, публикует посты и читает ленты, затем откат."""
+        User.objects.bulk_create(
+            User(username=f'bench_{role}_{number}')
+            for role, total in (
+                ('reader', options['users']), ('author', options['authors'])
+            )
+            for number in range(total)
+        )
+        users = list(User.objects.filter(username__startswith='bench_reader_'))
+        authors = list(User.objects.filter(
+            username__startswith='bench_author_'
+        ).order_by('pk'))
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users
+            for author in pick_authors(
+                authors, distribution, options['follows']
+            )
+        )
+        stats.reconcile()
+
+        started = time.perf_counter()
+        for _ in range(options['posts']):
+            for author in authors:
+                Post.objects.create(text='Тестовый пост', author=author)
+        posts_total = options['posts'] * len(authors)
+        write_ms = (time.perf_counter() - started) * 1000 / posts_total
+        rows = TimelineEntry.objects.count()
+
+        readers = random.sample(users, min(options['reads'], len(users)))
+        started = time.perf_counter()
+        for reader in readers:
+            timeline.TimelinePaginator(
+                reader, AMOUNT_PUBLICATION
+            ).get_cursor_page()
+        read_ms = (time.perf_counter() - started) * 1000 / len(readers)
+
+        transaction.set_rollback(True)
+        return rows, write_ms, read_ms
@@ -0,0 +1,83 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from posts.graph import FollowGraph
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def synthetic_edges(users, edges):
+    """Подписки в порядке (читатель, автор); авторов выбирают
+    с перекосом к небольшим id, как у популярных аккаунтов."""
+    per_user = edges // users
+    for user in range(1, users + 1):
+        authors = {
+            1 + int(users * random.random() ** 3) for _ in range(per_user)
+        }
+        authors.discard(user)
+        for author in sorted(authors):
+            yield user, author
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет память и время подсказок «кого почитать» в графе '
+        'подписок на синтетических данных; база не используется.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--edges', type=int, default=10_000_000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        users = options['users']
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        graph = FollowGraph.from_edges(
+            synthetic_edges(users, options['edges'])
+        )
+        build_s = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'Подписок: {len(graph.targets)}, построение: {build_s:.1f} с, '
+            f'массивы: {graph.nbytes / 2 ** 20:.1f} МБ, '
+            f'пик: {peak / 2 ** 20:.1f} МБ'
+        )
+
+        readers = [
+            random.randint(1, users) for _ in range(options['queries'])
+        ]
+        self.report('Подсказки', [
+            self.timed(graph.suggest, reader) for reader in readers
+        ])
+        self.report('Подписка', [
+            self.timed(graph.follow, reader, random.randint(1, users))
+            for reader in readers
+        ])
+        self.report('Отписка', [
+            self.timed(graph.unfollow, reader, graph.following(reader)[0])
+            for reader in readers if len(graph.following(reader))
+        ])
+
+    @staticmethod
+    def timed(function, *args):
+        started = time.perf_counter_ns()
+        function(*args)
+        return (time.perf_counter_ns() - started) / 1e6
+
+    def report(self, title, timings):
+        timings.sort()
+        self.stdout.write(
+            f'{title}, мс: p50 {percentile(timings, 0.5):.3f}, '
+            f'p99 {percentile(timings, 0.99):.3f}, max {timings[-1]:.3f}'
+        )
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import graph
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит снимок графа подписок для «кого почитать»; запускается '
+        'по расписанию, процессы сайта подхватывают новый снимок сами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help='Файл снимка, по умолчанию FOLLOW_GRAPH_SNAPSHOT.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.FOLLOW_GRAPH_SNAPSHOT
+        built = graph.build_snapshot(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок {path}: {len(built.targets)} подписок, '
+            f'{built.nbytes} байт'
+        ))
@@ -0,0 +1,172 @@
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts.models import Post
+
+
+def walk(root, deadline):
+    """Обходит дерево файлов, не собирая его целиком в память.
+
+    Файлы, изменённые после deadline, пропускаются: их может сохранять
+    запрос, который ещё не записал пост в базу.
+    """
+    directories = [root]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime <= deadline:
+                        yield entry.path, stat.st_size
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки, на которые не ссылается ни один '
+        'пост, и миниатюры, которых нет в хранилище ключей sorl.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+        parser.add_argument(
+            '--quarantine',
+            metavar='DIR',
+            help='Переносить файлы в DIR вместо удаления.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+        parser.add_argument('--verbose', action='store_true')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.storage = Post._meta.get_field('image').storage
+        self.root = self.storage.location
+        self.deadline = time.time() - options['min_age']
+        self.scanned = self.scanned_bytes = 0
+        self.orphans = self.orphan_bytes = 0
+        # Миниатюры картинок, которые удаляются в этом запуске.
+        self.doomed = set()
+        started = time.perf_counter()
+
+        upload_to = Post._meta.get_field('image').upload_to
+        for batch in self.files(upload_to):
+            self.collect_images(batch)
+        for batch in self.files(thumbnail_settings.THUMBNAIL_PREFIX):
+            self.collect_thumbnails(batch)
+
+        elapsed = time.perf_counter() - started
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {self.scanned} '
+            f'({self.scanned_bytes / 2 ** 20:.1f} МБ), '
+            f'{self.scanned / elapsed if elapsed else 0:.0f} файлов/с. '
+            f'{action}: {self.orphans} '
+            f'({self.orphan_bytes / 2 ** 20:.1f} МБ)'
+        ))
+
+    def files(self, prefix):
+        found = walk(os.path.join(self.root, prefix), self.deadline)
+        for batch in batches(found, self.options['batch_size']):
+            self.scanned += len(batch)
+            self.scanned_bytes += sum(size for _, size in batch)
+            yield [
+                (
+                    os.path.relpath(path, self.root).replace(os.sep, '/'),
+                    size,
+                )
+                for path, size in batch
+            ]
+
+    def collect_images(self, batch):
+        used = set(Post.objects.filter(
+            image__in=[name for name, _ in batch]
+        ).values_list('image', flat=True))
+        for name, size in batch:
+            if name not in used:
+                self.forget_thumbnails(name)
+                self.remove(name, size)
+
+    def collect_thumbnails(self, batch):
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): (name, size)
+            for name, size in batch
+        }
+        known = set(KVStore.objects.filter(
+            key__in=list(keys)
+        ).values_list('key', flat=True))
+        for key, (name, size) in keys.items():
+            if key not in known or name in self.doomed:
+                self.remove(name, size)
+
+    def forget_thumbnails(self, name):
+        """Запоминает миниатюры удаляемой картинки и убирает её
+        из хранилища ключей sorl."""
+        source = ImageFile(name, self.storage)
+        thumbnail_keys = default.kvstore._get(
+            source.key, identity='thumbnails'
+        ) or []
+        for key in thumbnail_keys:
+            thumbnail = default.kvstore._get(key)
+            if thumbnail is not None:
+                self.doomed.add(thumbnail.name)
+        if not self.options['dry_run']:
+            default.kvstore._delete_raw(
+                add_prefix(source.key),
+                add_prefix(source.key, 'thumbnails'),
+                *(add_prefix(key) for key in thumbnail_keys),
+            )
+
+    def remove(self, name, size):
+        path = os.path.join(self.root, name)
+        try:
+            # Файл могли загрузить заново, пока шёл обход.
+            if os.stat(path).st_mtime > self.deadline:
+                return
+        except FileNotFoundError:
+            return
+        self.orphans += 1
+        self.orphan_bytes += size
+        if self.options['verbose']:
+            self.stdout.write(name)
+        if self.options['dry_run']:
+            return
+        quarantine = self.options['quarantine']
+        if quarantine:
+            target = os.path.join(quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
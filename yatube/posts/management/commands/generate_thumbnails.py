@@ -0,0 +1,121 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import build_thumbnails, init_worker, run_in_worker
+
+
+class InlineExecutor:
+    """Выполняет задачи сразу, в том же процессе."""
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+    def shutdown(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры для картинок уже опубликованных постов '
+        'в нескольких процессах; прерванный запуск можно продолжить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов; 0 — строить в этом процессе.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Не больше стольких картинок в секунду; 0 — без ограничения.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            metavar='FILE',
+            help=(
+                'Файл, куда после каждой пачки пишется последняя '
+                'обработанная картинка; запуск продолжается с неё.'
+            ),
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить и уже готовые миниатюры.',
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        last = self.read_checkpoint(checkpoint)
+        names = Post.objects.exclude(image='').order_by('image').values_list(
+            'image', flat=True
+        ).distinct()
+        total = (names.filter(image__gt=last) if last else names).count()
+        executor = (
+            ProcessPoolExecutor(options['workers'], initializer=init_worker)
+            if options['workers'] else InlineExecutor()
+        )
+        worker = run_in_worker if options['workers'] else build_thumbnails
+        done = failed = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                remaining = names.filter(image__gt=last) if last else names
+                chunk = list(remaining[:options['chunk_size']])
+                if not chunk:
+                    break
+                results = executor.map(
+                    worker,
+                    self.paced(chunk, done, started, options['rate']),
+                    [options['force']] * len(chunk),
+                )
+                failed += sum(1 for built in results if not built)
+                done += len(chunk)
+                last = chunk[-1]
+                self.write_checkpoint(checkpoint, last)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{done}/{total} '
+                    f'({done / elapsed if elapsed else 0:.1f} картинок/с)'
+                )
+        finally:
+            executor.shutdown()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, с ошибками: {failed}'
+        ))
+
+    @staticmethod
+    def paced(chunk, done, started, rate):
+        """Отдаёт картинки не быстрее rate штук в секунду от начала
+        запуска."""
+        for number, name in enumerate(chunk, done):
+            if rate:
+                delay = started + number / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield name
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            return file.read().strip() or None
+
+    @staticmethod
+    def write_checkpoint(path, name):
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            file.write(name)
+        os.replace(f'{path}.tmp', path)
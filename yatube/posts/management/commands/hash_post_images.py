@@ -0,0 +1,57 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами по содержимому; '
+        'одинаковые картинки сводятся в один файл.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Не удалять файлы со старыми именами.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = list(Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct())
+        moved = shared = missing = 0
+        for name in names:
+            if storage.is_hashed(name):
+                continue
+            try:
+                with storage.open(name) as file:
+                    new_name = storage.hashed_name(name, file)
+                    if storage.exists(new_name):
+                        shared += 1
+                    else:
+                        storage.save(name, file)
+                        moved += 1
+            except (OSError, SuspiciousFileOperation):
+                missing += 1
+                continue
+            for post in Post.objects.filter(image=name):
+                post.image.name = new_name
+                post.save(update_fields=['image', 'updated_at'])
+            if not options['keep']:
+                # Миниатюры старого имени и их записи в KV-хранилище
+                # больше никому не нужны.
+                delete_thumbnails(ImageFile(name, storage), delete_file=False)
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {moved}, совпало с уже сохранёнными: {shared}, '
+            f'не найдено: {missing}'
+        ))
+        if moved:
+            self.stdout.write(
+                'Миниатюры для новых имён строит generate_thumbnails.'
+            )
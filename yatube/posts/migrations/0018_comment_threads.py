@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.utils.http import int_to_base36
+import django.db.models.deletion
+
+from posts.constants import COMMENT_PATH_STEP
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии становятся корнями веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    for pk in Comment.objects.values_list('pk', flat=True).iterator():
+        Comment.objects.filter(pk=pk).update(
+            path=int_to_base36(pk).rjust(COMMENT_PATH_STEP, '0')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень ответа'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
-from .constants import LEN_TEXT
+from core.storage import ContentAddressedStorage
+
+from .constants import (
+    COMMENT_MAX_DEPTH, COMMENT_PATH_STEP, LEN_TEXT, TAG_MAX_LENGTH,
+)
 
 User = get_user_model()
 
@@ -33,6 +37,10 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -51,13 +59,47 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+    image_placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Превью картинки',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:LEN_TEXT]
@@ -86,10 +128,41 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    parent = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='replies',
+        verbose_name='Ответ на',
+    )
+    # Звенья пути — id предков и самого комментария, поэтому ветка
+    # занимает непрерывный диапазон путей и читается одним запросом.
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=COMMENT_PATH_STEP * (COMMENT_MAX_DEPTH + 1),
+        editable=False,
+        blank=True,
+    )
+    depth = models.PositiveSmallIntegerField(
+        'Уровень ответа',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -110,3 +183,124 @@ class Follow(models.Model):
         verbose_name_plural = 'Лента авторов'
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'], name='unique_members')]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'], name='unique_timeline_entry')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые поддерживаются сигналами."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        max_length=TAG_MAX_LENGTH,
+        unique=True,
+        verbose_name='Тег',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """Обратный индекс тегов: строка на пару (тег, пост)."""
+    tag = models.ForeignKey(
+        Tag,
+        related_name='post_tags',
+        on_delete=models.CASCADE,
+        verbose_name='Тег',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='post_tags',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Тег поста'
+        verbose_name_plural = 'Теги постов'
+        constraints = [models.UniqueConstraint(
+            fields=['tag', 'post'], name='unique_post_tag')]
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='post_tag_pub_date_idx',
+            ),
+        ]
+
+
+class TagActivity(models.Model):
+    """Число постов с тегом за час; из этих строк считаются
+    популярные теги."""
+    tag = models.ForeignKey(
+        Tag,
+        related_name='activity',
+        on_delete=models.CASCADE,
+        verbose_name='Тег',
+    )
+    hour = models.DateTimeField(verbose_name='Час', db_index=True)
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+
+    class Meta:
+        verbose_name = 'Активность тега'
+        verbose_name_plural = 'Активность тегов'
+        constraints = [models.UniqueConstraint(
+            fields=['tag', 'hour'], name='unique_tag_activity')]
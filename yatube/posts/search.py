@@ -0,0 +1,155 @@
+import re
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import CURSOR_SEPARATOR, CursorPage, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+# Границы совпадения в сниппете: управляющие символы не встречаются
+# в тексте постов и переживают экранирование HTML.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 32
+SCORE = f'bm25({FTS_TABLE})'
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательского текста.
+
+    Каждое слово ищется как префикс, чтобы находились другие формы
+    слова; синтаксис FTS5 в запросе не поддерживается.
+    """
+    return ' '.join(
+        f'"{word}"*' for word in re.findall(r'\w+', query.lower())
+    )
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset посты, подходящие под запрос.
+
+    Подзапрос подключается через extra, а не pk__in=RawSQL: Django
+    обернёт его в лишние скобки, и SQLite вернёт из него только первую
+    строку.
+    """
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        where=[
+            f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match_expression(query) or '""'],
+    )
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def encode_search_cursor(post):
+    raw = f'{post.search_score!r}{CURSOR_SEPARATOR}{post.pk}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_search_cursor(cursor):
+    """Раскодирует курсор в пару (релевантность, id) или вернёт None."""
+    try:
+        raw = urlsafe_base64_decode(cursor).decode()
+        score, pk = raw.split(CURSOR_SEPARATOR)
+        return float(score), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+class SearchPaginator(CursorPaginator):
+    """Паджинатор по ключу (релевантность, id) для результатов поиска.
+
+    Релевантность — bm25 из FTS5: чем меньше, тем лучше совпадение.
+    """
+
+    def __init__(self, query, per_page):
+        Paginator.__init__(
+            self, Post.objects.select_related('author', 'group'), per_page
+        )
+        self.query = match_expression(query)
+
+    def get_cursor_page(self, after=None, before=None):
+        if not self.query:
+            return SearchPage([], self, False, False)
+        if before is not None:
+            rows = self._rows('<', 'DESC', before)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return SearchPage(
+                self._posts(rows), self, has_previous, has_next=True
+            )
+        rows = self._rows('>', 'ASC', after)
+        has_next = len(rows) > self.per_page
+        return SearchPage(
+            self._posts(rows[:self.per_page]), self, after is not None,
+            has_next,
+        )
+
+    def _rows(self, direction, order, cursor):
+        where, params = '', [self.query]
+        if cursor is not None:
+            where = (
+                f'AND ({SCORE} {direction} %s '
+                f'OR ({SCORE} = %s AND rowid {direction} %s))'
+            )
+            params += [cursor[0], cursor[0], cursor[1]]
+        with connection.cursor() as db:
+            db.execute(
+                f'SELECT rowid, {SCORE}, snippet({FTS_TABLE}, 0, '
+                f"'{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {where} '
+                f'ORDER BY {SCORE} {order}, rowid {order} LIMIT %s',
+                params + [self.per_page + 1],
+            )
+            return db.fetchall()
+
+    def _posts(self, rows):
+        posts = self.object_list.in_bulk([pk for pk, _, _ in rows])
+        found = []
+        for pk, score, snippet in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_score = score
+            post.highlighted = highlight(snippet)
+            found.append(post)
+        return found
+
+
+class SearchPage(CursorPage):
+    def next_cursor(self):
+        return encode_search_cursor(self.object_list[-1])
+
+    def previous_cursor(self):
+        return encode_search_cursor(self.object_list[0])
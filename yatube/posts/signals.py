@@ -0,0 +1,176 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    autocomplete, caching, comments, graph, images, search, stats, tags,
+    timeline,
+)
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def post_image_changed(sender, instance, **kwargs):
+    """Новая картинка пережимается до сохранения, а её размеры и превью
+    запоминаются, чтобы шаблонам не приходилось открывать хранилище."""
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+    elif not image._committed:
+        optimized = images.optimize(image)
+        if optimized is not None:
+            instance.image = optimized
+            image = instance.image
+        (
+            instance.image_width,
+            instance.image_height,
+            instance.image_placeholder,
+        ) = images.describe(image)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Сбрасывает кэш лент и обновляет поисковый индекс и теги; новый
+    пост учитывается в счётчике и попадает в ленты подписчиков."""
+    caching.bump_on_commit(
+        caching.POSTS_SCOPE, caching.post_scope(instance.pk)
+    )
+    if created or update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+        tags.sync_tags(instance)
+    if created:
+        stats.increment(instance.author_id, 'posts_count')
+        timeline.push_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    tags.untag_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump_on_commit(
+        caching.POSTS_SCOPE, caching.post_scope(instance.pk)
+    )
+    stats.decrement(instance.author_id, 'posts_count')
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """После подписки обновляются счётчики и в ленту добавляются
+    посты автора."""
+    if created:
+        stats.increment(instance.author_id, 'followers_count')
+        stats.increment(instance.user_id, 'following_count')
+        timeline.add_author(instance.user_id, instance.author_id)
+        graph.record_change(instance.user_id, instance.author_id, True)
+        bump_follow_generations(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """После отписки обновляются счётчики и посты автора убираются
+    из ленты."""
+    stats.decrement(instance.author_id, 'followers_count')
+    stats.decrement(instance.user_id, 'following_count')
+    timeline.remove_author(instance.user_id, instance.author_id)
+    graph.record_change(instance.user_id, instance.author_id, False)
+    bump_follow_generations(instance)
+
+
+def bump_follow_generations(follow):
+    """Подписка меняет ленту читателя и счётчики в профилях обоих."""
+    caching.bump_on_commit(
+        caching.follow_scope(follow.user_id),
+        caching.profile_scope(follow.user.username),
+        caching.profile_scope(follow.author.username),
+    )
+
+
+@receiver(pre_save, sender=Comment)
+def comment_placing(sender, instance, **kwargs):
+    """Ответ получает уровень в ветке; слишком глубокий ответ
+    поднимается к родителю."""
+    if instance.pk is None and instance.parent_id:
+        instance.parent = comments.reply_parent(instance.parent)
+        instance.depth = instance.parent.depth + 1
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        # Путь дописывается только самому комментарию: соседи по ветке
+        # не меняются.
+        instance.path = (
+            instance.parent.path if instance.parent_id else ''
+        ) + comments.path_segment(instance.pk)
+        Comment.objects.filter(pk=instance.pk).update(path=instance.path)
+    if created and instance.post_id:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1
+        )
+        caching.bump_on_commit(
+            caching.POSTS_SCOPE, caching.post_scope(instance.post_id)
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id:
+        Post.objects.filter(
+            pk=instance.post_id, comments_count__gt=0
+        ).update(comments_count=F('comments_count') - 1)
+        caching.bump_on_commit(
+            caching.POSTS_SCOPE, caching.post_scope(instance.post_id)
+        )
+
+
+@receiver(pre_save, sender=User)
+def user_renaming(sender, instance, update_fields=None, **kwargs):
+    """Старое имя запоминается до сохранения: после него его уже
+    не узнать."""
+    instance.old_username = None
+    instance.name_changed = False
+    names = ('username', 'first_name', 'last_name')
+    if instance.pk and (
+        update_fields is None or set(names) & set(update_fields)
+    ):
+        old = User.objects.filter(pk=instance.pk).values_list(
+            *names
+        ).first()
+        if old is not None:
+            if old[0] != instance.username:
+                instance.old_username = old[0]
+            instance.name_changed = old != tuple(
+                getattr(instance, name) for name in names
+            )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Новые и переименованные имена попадают в журнал, по которому
+    процессы обновляют индекс подсказок; с новым именем автора его
+    посты рендерятся заново."""
+    old_username = getattr(instance, 'old_username', None)
+    if created or old_username:
+        autocomplete.record_user_change(old_username, instance.username)
+    if getattr(instance, 'name_changed', False):
+        caching.bump_on_commit(
+            caching.POSTS_SCOPE, caching.author_scope(instance.pk)
+        )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.record_user_change(instance.username, None)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump_on_commit(autocomplete.GROUPS_SCOPE)
@@ -0,0 +1,72 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Follow, Post, User, UserStats
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def get_stats(user):
+    """Счётчики пользователя; для нового пользователя — нулевые."""
+    return (
+        UserStats.objects.filter(user=user).first()
+        or UserStats(user=user)
+    )
+
+
+def increment(user_id, field):
+    UserStats.objects.get_or_create(user_id=user_id)
+    UserStats.objects.filter(user_id=user_id).update(**{field: F(field) + 1})
+
+
+def decrement(user_id, field):
+    UserStats.objects.filter(
+        user_id=user_id, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
+
+
+def real_count(field):
+    """Подзапрос с настоящим значением счётчика для каждого пользователя."""
+    model, owner = COUNTERS[field]
+    counts = model.objects.filter(**{owner: OuterRef('pk')}).order_by(
+    ).values(owner).annotate(total=Count('pk')).values('total')
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()), 0
+    )
+
+
+def reconcile(batch_size=1000):
+    """Пересчитывает счётчики и чинит расхождения.
+
+    Возвращает количество исправленных пользователей.
+    """
+    users = User.objects.annotate(
+        **{f'real_{field}': real_count(field) for field in COUNTERS}
+    ).values_list('pk', *(f'real_{field}' for field in COUNTERS))
+    stored = {}
+    repaired = 0
+    for row in users.iterator(chunk_size=batch_size):
+        stored[row[0]] = dict(zip(COUNTERS, row[1:]))
+        if len(stored) >= batch_size:
+            repaired += _repair(stored)
+            stored = {}
+    return repaired + _repair(stored)
+
+
+def _repair(real):
+    repaired = 0
+    current = UserStats.objects.in_bulk(list(real))
+    for user_id, counters in real.items():
+        stats = current.get(user_id)
+        if stats is not None and all(
+            getattr(stats, field) == value
+            for field, value in counters.items()
+        ):
+            continue
+        UserStats.objects.update_or_create(user_id=user_id, defaults=counters)
+        repaired += 1
+    return repaired
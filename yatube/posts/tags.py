@@ -0,0 +1,98 @@
+import re
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .constants import TAG_MAX_LENGTH, TRENDING_LIMIT, TRENDING_WINDOW_HOURS
+from .models import PostTag, Tag, TagActivity
+
+# '#' после '&' — это HTML-сущность, после '/' — якорь в ссылке.
+HASHTAG = re.compile(r'(?<![\w#&/])#(\w+)')
+
+
+def extract_tags(text):
+    """Имена тегов из текста поста в нижнем регистре, без повторов."""
+    return {
+        name.lower()[:TAG_MAX_LENGTH] for name in HASHTAG.findall(text)
+    }
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def sync_tags(post):
+    """Приводит теги поста в индексе к тегам из его текста."""
+    names = extract_tags(post.text)
+    current = dict(PostTag.objects.filter(post=post).values_list(
+        'tag__name', 'tag_id'
+    ))
+    removed = [
+        tag_id for name, tag_id in current.items() if name not in names
+    ]
+    if removed:
+        PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+        count(removed, post, -1)
+    added = names - current.keys()
+    if added:
+        Tag.objects.bulk_create(
+            (Tag(name=name) for name in added), ignore_conflicts=True
+        )
+        tag_ids = list(Tag.objects.filter(name__in=added).values_list(
+            'pk', flat=True
+        ))
+        PostTag.objects.bulk_create(
+            (
+                PostTag(tag_id=tag_id, post=post, pub_date=post.pub_date)
+                for tag_id in tag_ids
+            ),
+            ignore_conflicts=True,
+        )
+        count(tag_ids, post, 1)
+
+
+def untag_post(post):
+    """Снимает счётчики тегов удаляемого поста; строки индекса удалит
+    каскад."""
+    tag_ids = list(PostTag.objects.filter(post=post).values_list(
+        'tag_id', flat=True
+    ))
+    if tag_ids:
+        count(tag_ids, post, -1)
+
+
+def count(tag_ids, post, delta):
+    """Меняет счётчики тегов и их активность за час публикации поста."""
+    hour = hour_of(post.pub_date)
+    if delta > 0:
+        TagActivity.objects.bulk_create(
+            (TagActivity(tag_id=tag_id, hour=hour) for tag_id in tag_ids),
+            ignore_conflicts=True,
+        )
+        tags = Tag.objects.filter(pk__in=tag_ids)
+        activity = TagActivity.objects.filter(tag_id__in=tag_ids, hour=hour)
+    else:
+        tags = Tag.objects.filter(pk__in=tag_ids, posts_count__gt=0)
+        activity = TagActivity.objects.filter(
+            tag_id__in=tag_ids, hour=hour, posts_count__gt=0
+        )
+    tags.update(posts_count=F('posts_count') + delta)
+    activity.update(posts_count=F('posts_count') + delta)
+
+
+def trending(limit=TRENDING_LIMIT):
+    """Теги, под которыми больше всего постов за последние часы.
+
+    Читаются только почасовые счётчики из окна, а не сами посты.
+    """
+    since = hour_of(timezone.now()) - timedelta(
+        hours=TRENDING_WINDOW_HOURS - 1
+    )
+    return list(
+        TagActivity.objects.filter(hour__gte=since).values(
+            'tag__name'
+        ).annotate(
+            total=Sum('posts_count')
+        ).filter(total__gt=0).order_by('-total', 'tag__name')[:limit]
+    )
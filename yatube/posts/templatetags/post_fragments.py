@@ -0,0 +1,64 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts.caching import author_scope, get_generation, get_generations
+from posts.constants import POST_FRAGMENT_TIMEOUT
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+FRAGMENT_KEY = 'posts:post-body:{}:{}:{}:{}'
+FRAGMENT_TEMPLATE = 'posts/includes/post_body.html'
+
+
+def fragment_key(post, author_generation=None):
+    """Ключ меняется вместе с постом и именем автора, поэтому
+    сбрасывать его не нужно."""
+    if author_generation is None:
+        author_generation = get_generation(author_scope(post.author_id))
+    return FRAGMENT_KEY.format(
+        post.pk, post.updated_at.timestamp(), post.comments_count,
+        author_generation,
+    )
+
+
+@register.simple_tag
+def prefetch_post_fragments(posts):
+    """Достаёт тела постов страницы одним get_many.
+
+    Поколения авторов страницы тоже читаются одним get_many. Для
+    промахов миниатюры загружаются одной пачкой, тела рендерятся
+    и сохраняются одним set_many, а готовый HTML кладётся
+    в post.rendered_body для list_posts.html. Тела с заглушкой вместо
+    миниатюры не кэшируются: миниатюра вот-вот будет готова.
+    """
+    posts = list(posts)
+    generations = get_generations(
+        {author_scope(post.author_id) for post in posts}
+    )
+    keys = {
+        fragment_key(
+            post, generations[author_scope(post.author_id)]
+        ): post
+        for post in posts
+    }
+    found = cache.get_many(keys)
+    prefetch_thumbnails(
+        post for key, post in keys.items() if key not in found
+    )
+    missing = {}
+    body_template = get_template(FRAGMENT_TEMPLATE)
+    for key, post in keys.items():
+        if key in found:
+            body = found[key]
+        else:
+            body = body_template.render({'post': post})
+            thumbnails = getattr(post, 'prefetched_thumbnails', {})
+            if None not in thumbnails.values():
+                missing[key] = body
+        post.rendered_body = mark_safe(body)
+    if missing:
+        cache.set_many(missing, POST_FRAGMENT_TIMEOUT)
+    return ''
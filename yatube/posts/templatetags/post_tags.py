@@ -0,0 +1,24 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from posts.constants import TAG_MAX_LENGTH
+from posts.tags import HASHTAG
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def hashtags(text, autoescape=True):
+    """Превращает #теги в тексте в ссылки на ленты тегов."""
+    if autoescape:
+        text = conditional_escape(text)
+
+    def link(match):
+        url = reverse(
+            'posts:tag_list', args=[match.group(1).lower()[:TAG_MAX_LENGTH]]
+        )
+        return f'<a href="{url}">{match.group(0)}</a>'
+
+    return mark_safe(HASHTAG.sub(link, text))
@@ -0,0 +1,61 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+
+from posts.thumbnails import backend, get_variants, thumbnail_dimensions
+
+register = template.Library()
+
+# Картинка занимает col-md-5 на широких экранах и всю ширину на узких.
+PICTURE_SIZES = '(min-width: 768px) 42vw, 100vw'
+
+
+def thumbnail_placeholder():
+    """Общая заглушка для картинки без превью."""
+    return static(settings.POSTS_THUMBNAIL_PLACEHOLDER)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def picture(image, size, css_class='', loading='lazy'):
+    """<picture> со всеми готовыми вариантами миниатюры size.
+
+    Пока построены не все варианты, выводится размытое превью картинки
+    или общая заглушка.
+    """
+    post = image.instance
+    width, height = thumbnail_dimensions(post, size)
+    context = {
+        'css_class': css_class,
+        'loading': loading,
+        'width': width,
+        'height': height,
+        'preview': post.image_placeholder,
+    }
+    srcsets = {}
+    for image_format, variant_width, geometry, options in get_variants(size):
+        thumbnail = backend.get_ready_thumbnail(image, geometry, **options)
+        if thumbnail is None:
+            return {
+                **context,
+                'placeholder': (
+                    post.image_placeholder or thumbnail_placeholder()
+                ),
+            }
+        srcsets.setdefault(image_format, []).append(
+            (variant_width, thumbnail.url)
+        )
+    *formats, fallback = srcsets
+    return {
+        **context,
+        'sizes': PICTURE_SIZES,
+        'sources': [
+            (f'image/{image_format.lower()}', srcset(srcsets[image_format]))
+            for image_format in formats
+        ],
+        'src': srcsets[fallback][-1][1],
+        'srcset': srcset(srcsets[fallback]),
+    }
+
+
+def srcset(variants):
+    return ', '.join(f'{url} {width}w' for width, url in variants)
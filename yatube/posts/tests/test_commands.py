@@ -0,0 +1,277 @@
+import os
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from ..models import (
+    Follow, Post, PostTag, TimelineEntry, User, UserStats,
+)
+from ..graph import load_snapshot
+from ..thumbnails import all_geometries, backend, generate_thumbnails
+
+
+def png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (4, 3), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), 'picture.png')
+
+
+def media_files(root):
+    return {
+        os.path.relpath(os.path.join(path, name), root)
+        for path, _, names in os.walk(root) for name in names
+    }
+
+
+class BackfillTimelineCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост № {number}', author=cls.author)
+            for number in range(3)
+        )
+
+    def test_backfill_fills_timeline(self):
+        """Команда добавляет в ленту посты, созданные мимо сигналов."""
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+
+    def test_backfill_is_idempotent(self):
+        """Повторный запуск не создаёт дубликатов."""
+        call_command('backfill_timeline', stdout=StringIO())
+        call_command('backfill_timeline', '--rebuild', stdout=StringIO())
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+
+
+class ReconcileUserStatsCommandTest(TestCase):
+    def test_reconcile_repairs_drift(self):
+        """Команда восстанавливает счётчики, разошедшиеся с данными."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=user, author=author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост № {number}', author=author)
+            for number in range(2)
+        )
+        UserStats.objects.filter(user=author).update(followers_count=5)
+        call_command('reconcile_user_stats', stdout=StringIO())
+        stats = UserStats.objects.get(user=author)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=user).following_count, 1)
+
+
+class BenchFeedCommandTest(TestCase):
+    def test_bench_feed_rolls_back(self):
+        """Бенчмарк печатает все режимы и не оставляет данных."""
+        out = StringIO()
+        call_command(
+            'bench_feed', '--users=20', '--authors=5', '--follows=3',
+            '--posts=1', '--reads=5', '--distribution=zipf', stdout=out,
+        )
+        for strategy in ('push', 'pull', 'hybrid'):
+            self.assertIn(strategy, out.getvalue())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Post.objects.exists())
+
+
+class BenchFollowGraphCommandTest(TestCase):
+    def test_bench_follow_graph(self):
+        out = StringIO()
+        call_command(
+            'bench_follow_graph', '--users=200', '--edges=2000',
+            '--queries=20', stdout=out,
+        )
+        self.assertIn('Подсказки, мс: p50', out.getvalue())
+
+
+class BuildFollowGraphCommandTest(TestCase):
+    def test_builds_snapshot(self):
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=reader, author=author)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.bin')
+            call_command(
+                'build_follow_graph', f'--path={path}', stdout=StringIO()
+            )
+            graph, _ = load_snapshot(path)
+        self.assertEqual(list(graph.following(reader.pk)), [author.pk])
+
+
+class HashPostImagesCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.old_storage = FileSystemStorage()
+        author = User.objects.create_user(username='writer')
+        for number in range(2):
+            name = self.old_storage.save(
+                f'posts/repost_{number}.gif', ContentFile(b'same picture'))
+            Post.objects.create(text='Репост', author=author, image=name)
+        Post.objects.create(
+            text='Без файла', author=author, image='posts/lost.gif')
+
+    def test_moves_and_deduplicates(self):
+        """Одинаковые картинки переезжают в один файл с именем
+        по содержимому."""
+        out = StringIO()
+        call_command('hash_post_images', stdout=out)
+        names = set(Post.objects.exclude(
+            image='posts/lost.gif').values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        storage = Post._meta.get_field('image').storage
+        self.assertTrue(storage.is_hashed(name))
+        self.assertTrue(storage.exists(name))
+        self.assertFalse(self.old_storage.exists('posts/repost_0.gif'))
+        self.assertIn('Перенесено: 1, совпало с уже сохранёнными: 1, '
+                      'не найдено: 1', out.getvalue())
+
+    def test_forgets_old_thumbnails(self):
+        """Миниатюры удалённого файла уходят вместе с записями о них."""
+        name = self.old_storage.save('posts/picture.png', png('red'))
+        Post.objects.create(
+            text='С картинкой', author=User.objects.get(), image=name)
+        generate_thumbnails(name)
+        source = ImageFile(name, Post._meta.get_field('image').storage)
+        thumbnails = [
+            backend.thumbnail_name(source, geometry, **options)
+            for geometry, options in all_geometries()
+        ]
+        self.assertTrue(all(map(default.storage.exists, thumbnails)))
+        call_command('hash_post_images', stdout=StringIO())
+        self.assertFalse(any(map(default.storage.exists, thumbnails)))
+        self.assertIsNone(default.kvstore.get(source))
+
+
+class CollectOrphanMediaCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = directory.name
+        cache.clear()
+        author = User.objects.create_user(username='writer')
+        self.kept = Post.objects.create(
+            text='Живой пост', author=author, image=png('red'))
+        deleted = Post.objects.create(
+            text='Удалённый пост', author=author, image=png('blue'))
+        for post in (self.kept, deleted):
+            generate_thumbnails(post.image.name)
+        deleted.delete()
+        stray = os.path.join(self.root, 'cache', 'zz', 'zz', 'stray.jpg')
+        os.makedirs(os.path.dirname(stray))
+        open(stray, 'wb').close()
+        self.before = media_files(self.root)
+
+    def test_dry_run_keeps_files(self):
+        """В режиме проверки файлы только подсчитываются."""
+        out = StringIO()
+        call_command(
+            'collect_orphan_media', '--dry-run', '--min-age=0', stdout=out)
+        self.assertEqual(media_files(self.root), self.before)
+        self.assertIn(
+            f'Будет удалено: {len(all_geometries()) + 2}', out.getvalue())
+
+    def test_removes_orphans(self):
+        """Удаляются картинка удалённого поста, её миниатюры
+        и неизвестные миниатюры; живые файлы остаются."""
+        call_command(
+            'collect_orphan_media', '--min-age=0', stdout=StringIO())
+        left = media_files(self.root)
+        self.assertEqual(len(left), len(all_geometries()) + 1)
+        self.assertIn(self.kept.image.name, left)
+        generate_thumbnails(self.kept.image.name)
+        self.assertEqual(media_files(self.root), left)
+
+    def test_recent_files_untouched(self):
+        """Свежие файлы не трогаются."""
+        call_command('collect_orphan_media', stdout=StringIO())
+        self.assertEqual(media_files(self.root), self.before)
+
+
+class GenerateThumbnailsCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        author = User.objects.create_user(username='writer')
+        self.posts = sorted(
+            (
+                Post.objects.create(
+                    text='Пост', author=author, image=png(color))
+                for color in ('red', 'green', 'blue')
+            ),
+            key=lambda post: post.image.name,
+        )
+        self.checkpoint = os.path.join(directory.name, 'checkpoint')
+
+    def ready(self, post):
+        return all(
+            backend.get_ready_thumbnail(post.image, geometry, **options)
+            for geometry, options in all_geometries()
+        )
+
+    def test_builds_all_images(self):
+        """Команда строит миниатюры всех картинок и убирает
+        контрольную точку."""
+        out = StringIO()
+        call_command(
+            'generate_thumbnails', '--workers=0', '--chunk-size=2',
+            f'--checkpoint={self.checkpoint}', stdout=out,
+        )
+        self.assertTrue(all(self.ready(post) for post in self.posts))
+        self.assertIn('2/3', out.getvalue())
+        self.assertIn('Обработано картинок: 3, с ошибками: 0', out.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_checkpoint(self):
+        """Запуск продолжается после картинки из контрольной точки."""
+        with open(self.checkpoint, 'w') as file:
+            file.write(self.posts[0].image.name)
+        out = StringIO()
+        call_command(
+            'generate_thumbnails', '--workers=0',
+            f'--checkpoint={self.checkpoint}', stdout=out,
+        )
+        self.assertFalse(self.ready(self.posts[0]))
+        self.assertTrue(self.ready(self.posts[2]))
+        self.assertIn('Обработано картинок: 2', out.getvalue())
+
+
+class BackfillTagsCommandTest(TestCase):
+    def test_backfill_indexes_tags(self):
+        """Команда индексирует теги постов, созданных мимо сигналов."""
+        author = User.objects.create_user(username='writer')
+        Post.objects.bulk_create([
+            Post(text='#один и #два', author=author),
+            Post(text='без тегов', author=author),
+        ])
+        call_command('backfill_tags', stdout=StringIO())
+        call_command('backfill_tags', stdout=StringIO())
+        self.assertEqual(PostTag.objects.count(), 2)
@@ -1,10 +1,59 @@
+import os
+import random
+import struct
+import tempfile
+import tracemalloc
+import zlib
 from http import HTTPStatus
+from io import BytesIO
 
-from django.test import Client, TestCase
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
+from ..images import optimize
 from ..models import Post, User, Group, Comment
+from ..uploads import LimitedUploadHandler
+from ..views import post_create
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def noise_image():
+    """Шум плохо сжимается, и пережатие с более высоким качеством
+    только увеличивает файл."""
+    generator = random.Random(0)
+    return Image.frombytes(
+        'RGB', (90, 60), bytes(generator.getrandbits(8) for _ in range(16200))
+    )
+
+
+def image_pixels(content):
+    with Image.open(BytesIO(content)) as image:
+        return image.tobytes()
+
+
+def png_header(width, height):
+    """PNG без пикселей: заголовок говорит о картинке width×height."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(b''))
+        + chunk(b'IEND', b'')
+    )
 
 
 class PostCreateTests(TestCase):
@@ -106,6 +155,132 @@ class PostCreateTests(TestCase):
         self.assertEqual(post.group_id, form_data['group'])
 
 
+class ImageLimitsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_too_many_pixels(self):
+        """Картинка с огромным числом пикселей отклоняется
+        по заголовку."""
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Огромная картинка',
+            'image': SimpleUploadedFile(
+                'huge.png', png_header(8000, 8000), 'image/png'),
+        })
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'too_many_pixels',
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    def test_large_upload_peak_memory(self):
+        """Загрузка 50 МБ не держит файл в памяти целиком."""
+        request = RequestFactory().post(reverse('posts:post_create'), {
+            'text': 'Тяжёлый файл',
+            'image': SimpleUploadedFile(
+                'large.gif', SMALL_GIF + bytes(50 * 1024 * 1024),
+                'image/gif'),
+        })
+        request.user = self.user
+        tracemalloc.start()
+        try:
+            response = post_create(request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+        self.assertLess(peak, 10 * 1024 * 1024)
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=1024)
+    def test_upload_stops_at_limit(self):
+        """Сверх лимита на диск ничего не пишется, а форма отклоняет
+        файл по настоящему размеру."""
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'large.gif', 'image/gif', None)
+        content = SMALL_GIF + bytes(10 * 1024)
+        for start in range(0, len(content), 100):
+            handler.receive_data_chunk(content[start:start + 100], start)
+        file = handler.file_complete(len(content))
+        self.addCleanup(file.close)
+        self.assertEqual(file.size, len(content))
+        self.assertEqual(os.path.getsize(file.temporary_file_path()), 1024)
+
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Тяжёлый файл',
+            'image': SimpleUploadedFile('large.gif', content, 'image/gif'),
+        })
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'file_too_large',
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+
+class ImageProcessingTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=directory.name, POSTS_IMAGE_MAX_DIMENSION=100)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='photographer')
+        self.client.force_login(self.user)
+
+    def test_photo_rotated_shrunk_and_stripped(self):
+        """Фото поворачивается по EXIF, уменьшается и теряет
+        метаданные."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        buffer = BytesIO()
+        Image.new('RGB', (300, 100), 'red').save(
+            buffer, 'JPEG', quality=100, exif=exif.tobytes())
+        with self.assertLogs('posts.images', 'INFO') as logs:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Фото с телефона',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', buffer.getvalue(), 'image/jpeg'),
+            })
+        post = Post.objects.get(author=self.user)
+        self.assertEqual((post.image_width, post.image_height), (33, 100))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (33, 100))
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertIn(f'{len(buffer.getvalue())} → {post.image.size}',
+                      logs.output[0])
+
+    def test_compressed_photo_not_grown(self):
+        """Сильно сжатое фото не пережимается в файл больше исходного,
+        а только теряет метаданные."""
+        image = noise_image()
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=50, exif=exif.tobytes())
+        original = buffer.getvalue()
+        optimized = optimize(
+            SimpleUploadedFile('photo.jpg', original, 'image/jpeg'))
+        self.assertLess(optimized.size, len(original))
+        with Image.open(optimized) as result:
+            self.assertEqual(len(result.getexif()), 0)
+            self.assertEqual(result.tobytes(), image_pixels(original))
+
+    def test_plain_photo_kept(self):
+        """Без метаданных и лишних пикселей файл остаётся как есть."""
+        image = noise_image()
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=50)
+        self.assertIsNone(optimize(SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), 'image/jpeg')))
+
+
 class CommentFormTest(TestCase):
     def setUp(self):
         self.guest_client = Client()
@@ -143,6 +318,14 @@ class CommentFormTest(TestCase):
         self.assertEqual(comment.text, form_data['text'])
         self.assertEqual(comment.post_id, form_data['post_id'])
         self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, comment_count + 1)
+
+    def test_delete_comment_updates_counter(self):
+        """Удаление комментария уменьшает счётчик поста."""
+        self.comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
 
     def test_no_edit_comment(self):
         """Проверка запрета комментирования не авторизованого пользователя"""
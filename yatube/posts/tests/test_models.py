@@ -1,7 +1,29 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from ..models import Group, Post, User
+from ..models import Follow, Group, Post, PostTag, User, UserStats
 from ..constants import LEN_TEXT
+from ..timeline import TimelinePaginator
+from ..utils import CursorPaginator, EntryCursorPaginator
+
+
+def query_plan(sql, params=()):
+    """План запроса SQLite одной строкой."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return ' | '.join(row[-1] for row in cursor.fetchall())
+
+
+def read_plans(paginator):
+    """Планы чтения страниц вперёд и назад от курсора."""
+    plans = []
+    for newer in (False, True):
+        with CaptureQueriesContext(connection) as queries:
+            paginator.read((timezone.now(), 1), newer)
+        plans.append(query_plan(queries.captured_queries[-1]['sql']))
+    return plans
 
 
 class PostModelTest(TestCase):
@@ -31,3 +53,61 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         title = group.__str__()
         self.assertEqual(title, group.title)
+
+
+class UserStatsModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def test_counters_follow_posts_and_follows(self):
+        """Счётчики меняются при создании и удалении постов и подписок."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        author_stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1)
+
+        post.delete()
+        follow.delete()
+        author_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 0)
+
+
+class QueryPlanTest(TestCase):
+    def assertIndexRange(self, paginator, index):
+        """Страницы читаются диапазоном по составному индексу от курсора,
+        без сортировки во временном B-дереве."""
+        for plan in read_plans(paginator):
+            with self.subTest(index=index, plan=plan):
+                self.assertIn(f'{index} (', plan)
+                self.assertIn('pub_date', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_author_and_group_pages_use_index(self):
+        self.assertIndexRange(
+            CursorPaginator(Post.objects.filter(author_id=1), 10),
+            'post_author_pub_date_idx',
+        )
+        self.assertIndexRange(
+            CursorPaginator(Post.objects.filter(group_id=1), 10),
+            'post_group_pub_date_idx',
+        )
+
+    def test_tag_pages_use_index(self):
+        self.assertIndexRange(
+            EntryCursorPaginator(PostTag.objects.filter(tag_id=1), 10),
+            'post_tag_pub_date_idx',
+        )
+
+    def test_follow_pages_use_index(self):
+        self.assertIndexRange(
+            TimelinePaginator(1, 10), 'timeline_user_pub_date_idx'
+        )
@@ -1,13 +1,43 @@
+from http import HTTPStatus
+import os
+import shutil
+import tempfile
+from datetime import timedelta
 from math import ceil
+from unittest import mock
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.paginator import InvalidPage, Page
 
-from ..models import Post, Group, User, Comment, Follow
-from ..constants import AMOUNT_PUBLICATION
+from ..caching import (
+    CHANGE_KEY, PAGE_LOCK_KEY, ChangeLog, get_generation, post_scope,
+)
+from .. import autocomplete, timeline
+from ..graph import FollowGraph, GraphService, build_snapshot
+from ..templatetags.post_fragments import fragment_key
+from ..thumbnails import (
+    all_geometries, available_formats, backend, generate_thumbnails,
+    get_variants, prefetch_thumbnails,
+)
+from ..models import (
+    Post, Group, User, Comment, Follow, Tag, TagActivity, TimelineEntry,
+)
+from ..utils import encode_cursor
+from ..constants import (
+    AMOUNT_PUBLICATION, COMMENT_MAX_DEPTH, COMMENT_REPLIES_PER_PAGE,
+    COMMENTS_PER_PAGE,
+)
+
+
+def run_at_once(func):
+    """Замена transaction.on_commit: TestCase не коммитит транзакцию."""
+    func()
 
 
 class PaginatorViewsTest(TestCase):
@@ -30,6 +60,9 @@ class PaginatorViewsTest(TestCase):
                                    author=cls.user))
         Post.objects.bulk_create(test_posts)
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator_post_in_page(self):
         """Проверка количества постов
          на первой и второй страницах index,
@@ -70,6 +103,81 @@ class PaginatorViewsTest(TestCase):
                     )
 
 
+class KeysetPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_POSTS = 15
+        cls.user = User.objects.create_user(username='User')
+        Post.objects.bulk_create(
+            Post(text=f'Текст поста № {number}', author=cls.user)
+            for number in range(cls.TEST_POSTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_keyset_pages_follow_cursors(self):
+        """Курсоры ?after= и ?before= листают ленту без пропусков."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        first_page = self.client.get(reverse('posts:index')).context[
+            'page_obj']
+        self.assertTrue(first_page.is_cursor)
+        self.assertEqual(list(first_page), expected[:AMOUNT_PUBLICATION])
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+
+        second_page = self.client.get(
+            reverse('posts:index'),
+            {'after': first_page.next_cursor()},
+        ).context['page_obj']
+        self.assertEqual(list(second_page), expected[AMOUNT_PUBLICATION:])
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+
+        back_page = self.client.get(
+            reverse('posts:index'),
+            {'before': second_page.previous_cursor()},
+        ).context['page_obj']
+        self.assertEqual(list(back_page), expected[:AMOUNT_PUBLICATION])
+        self.assertFalse(back_page.has_previous())
+
+    def test_cursor_page_works_with_generic_code(self):
+        """Общий код паджинации не падает на странице курсора."""
+        page_obj = self.client.get(reverse('posts:index')).context[
+            'page_obj']
+        self.assertEqual(page_obj.paginator.count, self.TEST_POSTS)
+        with self.assertRaises(InvalidPage):
+            page_obj.next_page_number()
+
+    def test_page_number_uses_offset_paginator(self):
+        """Явный ?page= обслуживается обычным Paginator."""
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(
+            len(page_obj), self.TEST_POSTS - AMOUNT_PUBLICATION
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'after': '!!'})
+        self.assertEqual(
+            len(response.context['page_obj']), AMOUNT_PUBLICATION
+        )
+
+    def test_cursor_with_huge_id_returns_first_page(self):
+        """Курсор с id больше INTEGER базы считается испорченным."""
+        post = Post.objects.latest('pub_date')
+        post.pk = 10 ** 30
+        response = self.client.get(
+            reverse('posts:index'), {'after': encode_cursor(post)})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            len(response.context['page_obj']), AMOUNT_PUBLICATION
+        )
+
+
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -90,6 +198,7 @@ class PostViewsTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.user2 = User.objects.create_user(username='auth2')
@@ -196,6 +305,10 @@ class PostViewsTests(TestCase):
         self.assertEqual(response.context['author'], self.post.author)
         self.correct_attributes_post(response.context['page_obj'][0])
         self.assertEqual(response.context['following'], True)
+        self.assertEqual(
+            response.context['stats'].posts_count,
+            Post.objects.filter(author=self.post.author).count(),
+        )
 
     def test_not_added_in_foreign_group(self):
         """Пост при создании не добавляется в чужую группу."""
@@ -230,16 +343,364 @@ class PostViewsTests(TestCase):
         before_create_post = self.authorized_client.get(
             reverse('posts:index'))
         first_item_before = before_create_post.content
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(cached.content, first_item_before)
+        cache.clear()
+        after_clear = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(after_clear.content, first_item_before)
+
+    def test_cache_invalidated_by_new_post(self):
+        """Новый пост сразу виден на закэшированной странице."""
+        self.authorized_client.get(reverse('posts:index'))
         Post.objects.create(
             author=self.user,
             text='Проверка кэша',
             group=self.group)
-        after_create_post = self.authorized_client.get(reverse('posts:index'))
-        first_item_after = after_create_post.content
-        self.assertEqual(first_item_after, first_item_before)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Проверка кэша')
+
+    def test_cache_varies_by_page(self):
+        """Разные страницы ленты не делят один фрагмент."""
+        Post.objects.bulk_create(
+            Post(text=f'Текст поста № {number}', author=self.user)
+            for number in range(AMOUNT_PUBLICATION)
+        )
+        first_page = self.client.get(reverse('posts:index'))
+        second_page = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertNotEqual(first_page.content, second_page.content)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.user)
+
+    def setUp(self):
         cache.clear()
-        after_clear = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(first_item_after, after_clear)
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит шаблон заново."""
+        first = self.client.get(reverse('posts:index'))
+        second = self.client.get(reverse('posts:index'))
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_authorized_page_not_cached(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'))
+        self.assertIsNotNone(client.get(reverse('posts:index')).context)
+
+    def test_write_purges_page(self):
+        """После нового комментария страница поста перестраивается."""
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(address)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.client.get(address)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_new_post_purges_post_page(self):
+        """Страница поста показывает новое число постов автора."""
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(address)
+        Post.objects.create(text='Второй пост', author=self.user)
+        response = self.client.get(address)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(response.context['stats'].posts_count, 2)
+
+    def test_stale_page_served_while_rebuilding(self):
+        """Пока страницу перестраивает другой запрос, отдаётся
+        старая копия."""
+        self.client.get(reverse('posts:index'))
+        cache.add(PAGE_LOCK_KEY.format(reverse('posts:index')), 1)
+        Post.objects.create(text='Второй пост', author=self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNone(response.context)
+        self.assertNotContains(response, 'Второй пост')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.user)
+
+    def test_not_modified_until_write(self):
+        """Пока поколение не менялось, отвечаем 304."""
+        addresses = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        for address in addresses:
+            with self.subTest(address=address):
+                etag = self.client.get(address)['ETag']
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Новый')
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_changes_profile_etag(self):
+        address = reverse('posts:profile', args=[self.user.username])
+        etag = self.client.get(address)['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_differs_per_user(self):
+        client = Client()
+        client.force_login(self.reader)
+        self.assertNotEqual(
+            client.get(reverse('posts:index'))['ETag'],
+            self.client.get(reverse('posts:index'))['ETag'],
+        )
+
+    def test_etag_changes_after_new_login(self):
+        """После выхода и нового входа токен CSRF другой, и страница
+        с формой не отдаётся из кэша браузера."""
+        credentials = {'username': 'visitor', 'password': 'password'}
+        User.objects.create_user(**credentials)
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.post(reverse('users:login'), credentials)
+        etag = self.client.get(address)['ETag']
+        self.client.get(reverse('users:logout'))
+        self.client.post(reverse('users:login'), credentials)
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.log = ChangeLog('test', 60)
+        self.start = self.log.last()
+
+    def test_read_after_append(self):
+        self.log.append('first')
+        self.log.append('second')
+        self.assertEqual(
+            self.log.read(self.start, self.log.last()), ['first', 'second'])
+        cache.delete(CHANGE_KEY.format('test', self.start + 1))
+        self.assertIsNone(self.log.read(self.start, self.log.last()))
+
+    def test_counter_never_ahead_of_records(self):
+        """Номер, занятый другим процессом, пропускается, а счётчик
+        растёт только после записи."""
+        cache.add(CHANGE_KEY.format('test', self.start + 1), 'claimed')
+        self.log.append('mine')
+        self.assertEqual(
+            self.log.read(self.start, self.log.last()), ['claimed'])
+
+
+class PostFragmentCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_fragment_cached_and_versioned(self):
+        """Тело поста кэшируется по ключу, который меняется
+        при редактировании."""
+        self.reader_client.get(reverse('posts:index'))
+        old_key = fragment_key(self.post)
+        self.assertIn('Текст поста', cache.get(old_key))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertNotEqual(fragment_key(self.post), old_key)
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_fragment_follows_author_rename(self):
+        """После переименования автора тело поста показывает новое
+        имя и ссылку на новый профиль."""
+        self.reader_client.get(reverse('posts:index'))
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.first_name = 'Новое имя'
+        author.save()
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое имя')
+        self.assertContains(
+            response, reverse('posts:profile', args=['renamed']))
+
+    def test_edit_button_only_for_author(self):
+        """Кэш тела поста не переносит кнопку редактирования."""
+        edit_url = reverse('posts:post_edit', args=[self.post.pk])
+        self.assertContains(
+            self.author_client.get(reverse('posts:index')), edit_url)
+        self.assertNotContains(
+            self.reader_client.get(reverse('posts:index')), edit_url)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюра не построена, шаблон показывает превью,
+        а без превью — общую заглушку."""
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertContains(
+            self.client.get(address), f'src="{self.post.image_placeholder}"')
+        Post.objects.filter(pk=self.post.pk).update(image_placeholder='')
+        cache.clear()
+        self.assertContains(self.client.get(address), 'placeholder.svg')
+        generate_thumbnails(self.post.image.name)
+        response = self.client.get(address)
+        for _, width, geometry, options in get_variants('detail'):
+            thumbnail = backend.get_ready_thumbnail(
+                self.post.image, geometry, **options)
+            self.assertIsNotNone(thumbnail)
+            self.assertContains(response, f'{thumbnail.url} {width}w')
+        self.assertNotContains(response, 'placeholder.svg')
+
+    def test_ready_thumbnails_not_rebuilt(self):
+        """Повторный запуск ничего не строит и не трогает ни пост,
+        ни общее поколение лент."""
+        scope = post_scope(self.post.pk)
+        generation = get_generation(scope)
+        posts_generation = get_generation()
+        self.assertTrue(generate_thumbnails(self.post.image.name))
+        self.assertNotEqual(get_generation(scope), generation)
+        self.assertNotEqual(get_generation(), posts_generation)
+        generation = get_generation(scope)
+        posts_generation = get_generation()
+        self.assertFalse(generate_thumbnails(self.post.image.name))
+        self.assertEqual(get_generation(scope), generation)
+        self.assertEqual(get_generation(), posts_generation)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).updated_at,
+            self.post.updated_at,
+        )
+
+    def test_feed_refreshed_after_build(self):
+        """Блок ленты, закэшированный с заглушкой, перестраивается,
+        когда миниатюры готовы."""
+        address = reverse('posts:profile', args=[self.user.username])
+        self.assertNotContains(self.client.get(address), 'srcset=')
+        generate_thumbnails(self.post.image.name)
+        self.assertContains(self.client.get(address), 'srcset=')
+
+    def test_identical_uploads_share_file(self):
+        """Повторная загрузка той же картинки не создаёт новый файл."""
+        repost = Post.objects.create(
+            text='Репост',
+            author=self.user,
+            image=SimpleUploadedFile('repost.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.assertEqual(repost.image.name, self.post.image.name)
+
+    def test_image_dimensions_stored(self):
+        """Размеры и превью картинки сохраняются при загрузке."""
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (2, 1))
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/jpeg;base64,'))
+
+    def test_picture_has_dimensions(self):
+        """Картинка выводится с размерами и ленивой загрузкой."""
+        generate_thumbnails(self.post.image.name)
+        with mock.patch(
+                'django.core.files.storage.FileSystemStorage._open'
+        ) as storage_open:
+            response = self.client.get(reverse('posts:index'))
+        storage_open.assert_not_called()
+        self.assertContains(response, 'width="1280" height="840"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, self.post.image_placeholder)
+
+    def test_picture_sources(self):
+        """Для каждого формата, кроме последнего, выводится <source>."""
+        generate_thumbnails(self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        *formats, fallback = available_formats()
+        for image_format in formats:
+            self.assertContains(
+                response, f'type="image/{image_format.lower()}"')
+        self.assertNotContains(
+            response, f'type="image/{fallback.lower()}"')
+        self.assertContains(response, 'sizes=')
+
+    def test_prefetch_thumbnails_in_one_round_trip(self):
+        """Миниатюры страницы загружаются одним запросом, а дальше
+        берутся из памяти."""
+        Post.objects.create(
+            text='Второй пост',
+            author=self.user,
+            image=SimpleUploadedFile('second.gif', SMALL_GIF, 'image/gif'),
+        )
+        for post in Post.objects.all():
+            generate_thumbnails(post.image.name)
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        with self.assertNumQueries(0), \
+                mock.patch.object(caches['default'], 'get') as cache_get:
+            for post in posts:
+                for geometry, options in all_geometries():
+                    self.assertIsNotNone(backend.get_ready_thumbnail(
+                        post.image, geometry, **options))
+        cache_get.assert_not_called()
+
+    def test_new_image_queued(self):
+        """Загрузка картинки ставит миниатюры в очередь."""
+        with mock.patch('posts.views.queue_thumbnails') as queue:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    'new.gif', SMALL_GIF, 'image/gif'),
+            })
+        queue.assert_called_once()
 
 
 class FollowViewsTest(TestCase):
@@ -272,6 +733,24 @@ class FollowViewsTest(TestCase):
         new_post = response.context['page_obj'].object_list[0]
         self.assertEqual(new_post_follower.text, new_post.text)
 
+    def test_follow_pages_by_cursor(self):
+        """Лента подписок листается курсором по индексу ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(AMOUNT_PUBLICATION + 2)
+        ][::-1]
+        first = self.authorized_client.get(reverse('posts:follow_index'))
+        page = first.context['page_obj']
+        self.assertIs(type(page), Page)
+        self.assertEqual(list(page), posts[:AMOUNT_PUBLICATION])
+        self.assertContains(first, f'after={page.next_cursor()}')
+        second = self.authorized_client.get(
+            reverse('posts:follow_index'), {'after': page.next_cursor()})
+        self.assertEqual(
+            list(second.context['page_obj']), posts[AMOUNT_PUBLICATION:])
+        self.assertFalse(second.context['page_obj'].has_next())
+
     def test_follow_another_user(self):
         """Авторизованный пользователь,
         может подписываться на других пользователей."""
@@ -314,3 +793,581 @@ class FollowViewsTest(TestCase):
             reverse('posts:follow_index'))
         new_post_unfollower = response_unfollower.context['page_obj']
         self.assertNotIn(new_post_follower, new_post_unfollower)
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Post.objects.create(author=self.author, text='Текстовый текст')
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user).exists())
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_popular_author_posts_are_pulled(self):
+        """Посты автора выше порога не раскладываются по лентам,
+        но подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user2, author=self.author)
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_pulled_posts_are_merged_by_cursor(self):
+        """Посты из ленты и посты популярного автора сливаются
+        в один порядок и листаются курсором."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user2, author=self.author)
+        Follow.objects.create(user=self.user, author=self.user2)
+        posts = [
+            Post.objects.create(
+                author=(self.author, self.user2)[number % 2],
+                text=f'Пост {number}',
+            )
+            for number in range(AMOUNT_PUBLICATION + 2)
+        ][::-1]
+        first = self.authorized_client.get(reverse('posts:follow_index'))
+        page = first.context['page_obj']
+        self.assertIs(type(page), Page)
+        self.assertEqual(list(page), posts[:AMOUNT_PUBLICATION])
+        second = self.authorized_client.get(
+            reverse('posts:follow_index'), {'after': page.next_cursor()})
+        self.assertEqual(
+            list(second.context['page_obj']), posts[AMOUNT_PUBLICATION:])
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_below_limit_is_pushed_again(self):
+        """Когда подписчиков становится не больше порога,
+        посты автора снова раскладываются по лентам после запроса."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user2, author=self.author)
+        post = Post.objects.create(author=self.author, text='Популярный')
+        with mock.patch('posts.timeline.queue_push_author') as queue:
+            self.authorized_client2.get(reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author}))
+        queue.assert_called_once_with(self.author.pk)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        timeline.push_author(self.author.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.cats = Post.objects.create(
+            text='Котики гуляют по крыше', author=cls.user)
+        cls.many_cats = Post.objects.create(
+            text='кот кот кот', author=cls.user)
+        cls.dogs = Post.objects.create(
+            text='Собаки <b>лают</b>', author=cls.user)
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def found(self, response):
+        return list(response.context['page_obj'])
+
+    def test_ranked_prefix_search(self):
+        """Находятся формы слова, лучшие совпадения идут первыми."""
+        self.assertEqual(
+            self.found(self.search('кот')), [self.many_cats, self.cats])
+        self.assertEqual(self.found(self.search('СОБАКИ')), [self.dogs])
+        self.assertEqual(self.found(self.search('кот собаки')), [])
+
+    def test_highlight_is_escaped(self):
+        """Совпадения подсвечиваются, а HTML из текста экранируется."""
+        response = self.search('лают')
+        self.assertContains(response, '&lt;b&gt;<mark>лают</mark>')
+        self.assertNotContains(response, '<b>лают')
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.create(text='Первая версия', author=self.user)
+        post.text = 'Вторая версия'
+        post.save()
+        self.assertEqual(self.found(self.search('первая')), [])
+        self.assertEqual(self.found(self.search('вторая')), [post])
+        post.delete()
+        self.assertEqual(self.found(self.search('вторая')), [])
+
+    def test_keyset_pages(self):
+        """Результаты листаются курсором, запрос сохраняется в ссылках."""
+        Post.objects.bulk_create(
+            Post(text=f'Заметка номер {number}', author=self.user)
+            for number in range(AMOUNT_PUBLICATION + 2)
+        )
+        for post in Post.objects.filter(text__startswith='Заметка'):
+            post.save()
+        first = self.search('заметк')
+        page = first.context['page_obj']
+        self.assertEqual(len(page), AMOUNT_PUBLICATION)
+        self.assertContains(
+            first, f'?{urlencode({"q": "заметк"})}&amp;after=')
+        second = self.search('заметк', after=page.next_cursor())
+        self.assertEqual(len(second.context['page_obj']), 2)
+        self.assertFalse(
+            set(second.context['page_obj']) & set(page.object_list))
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'})
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.cats, self.many_cats},
+        )
+
+
+class TagViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.cats = Post.objects.create(
+            text='Гуляем #Котики и #погода', author=cls.user)
+        cls.weather = Post.objects.create(
+            text='Снова #погода, а это не тег: a#b', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tags_extracted(self):
+        """Теги попадают в индекс в нижнем регистре и со счётчиками."""
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'posts_count')),
+            {'котики': 1, 'погода': 2},
+        )
+
+    def test_tag_feed(self):
+        """Лента тега показывает посты с тегом, новые сверху."""
+        response = self.client.get(
+            reverse('posts:tag_list', args=['ПОГОДА']))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.weather, self.cats])
+        self.assertContains(
+            response, reverse('posts:tag_list', args=['котики']))
+
+    def test_tag_feed_pages(self):
+        """Лента тега листается курсором."""
+        for number in range(AMOUNT_PUBLICATION):
+            Post.objects.create(text=f'#погода № {number}', author=self.user)
+        first = self.client.get(reverse('posts:tag_list', args=['погода']))
+        page = first.context['page_obj']
+        self.assertEqual(len(page), AMOUNT_PUBLICATION)
+        second = self.client.get(
+            reverse('posts:tag_list', args=['погода']),
+            {'after': page.next_cursor()},
+        )
+        self.assertEqual(
+            list(second.context['page_obj']), [self.weather, self.cats])
+
+    def test_edit_and_delete_update_counters(self):
+        """Правка и удаление поста меняют счётчики тегов."""
+        post = Post.objects.get(pk=self.cats.pk)
+        post.text = 'Без тегов'
+        post.save()
+        Post.objects.filter(pk=self.weather.pk).delete()
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'posts_count')),
+            {'котики': 0, 'погода': 0},
+        )
+        self.assertFalse(
+            TagActivity.objects.filter(posts_count__gt=0).exists())
+
+    def test_trending(self):
+        """Популярные теги считаются по почасовым счётчикам."""
+        response = self.client.get(reverse('posts:trending_tags'))
+        self.assertEqual(
+            [(tag['tag__name'], tag['total'])
+             for tag in response.context['tags']],
+            [('погода', 2), ('котики', 1)],
+        )
+        TagActivity.objects.update(
+            hour=timezone.now() - timedelta(days=2))
+        cache.clear()
+        response = self.client.get(reverse('posts:trending_tags'))
+        self.assertEqual(response.context['tags'], [])
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.user)
+        cls.authors = [
+            User.objects.create_user(username=f'commenter{number}')
+            for number in range(3)
+        ]
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=cls.authors[number % 3],
+                text=f'Комментарий {number}',
+            )
+            for number in range(COMMENTS_PER_PAGE + 5)
+        ][::-1]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page(self):
+        """На странице поста первая страница комментариев, новые сверху,
+        и кнопка «Показать ещё»."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:COMMENTS_PER_PAGE])
+        self.assertContains(response, 'Комментарий 24')
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=[self.post.pk])
+            + f'?after={page.next_cursor()}',
+        )
+
+    def test_load_more(self):
+        """Фрагмент отдаёт следующую страницу с авторами и ответами
+        за три запроса."""
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        cursor = first.context['comments'].next_cursor()
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'after': cursor},
+            )
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[COMMENTS_PER_PAGE:],
+        )
+        self.assertContains(response, 'commenter0')
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_missing_post(self):
+        response = self.client.get(reverse('posts:post_comments', args=[0]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_generation_bumped_after_commit(self):
+        """Поколение поста сдвигается ещё раз после коммита комментария."""
+        scope = post_scope(self.post.pk)
+        self.client.force_login(self.user)
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            self.client.post(
+                reverse('posts:add_comment', args=[self.post.pk]),
+                {'text': 'Новый комментарий'},
+            )
+        generation = get_generation(scope)
+        on_commit.call_args[0][0]()
+        self.assertNotEqual(get_generation(scope), generation)
+
+
+class CommentThreadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='replier')
+        cls.post = Post.objects.create(text='Пост с ветками', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.root = Comment.objects.create(
+            post=self.post, author=self.user, text='Корень')
+
+    def reply(self, parent, text='Ответ'):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': text, 'parent': parent.pk},
+        )
+        return Comment.objects.latest('pk')
+
+    def test_reply_path(self):
+        """Путь ответа продолжает путь родителя, пути соседей
+        не меняются."""
+        first = self.reply(self.root)
+        first_path = first.path
+        second = self.reply(self.root)
+        nested = self.reply(first)
+        self.assertEqual(first.parent, self.root)
+        self.assertEqual(first.depth, 1)
+        self.assertTrue(first.path.startswith(self.root.path))
+        self.assertTrue(nested.path.startswith(first.path))
+        self.assertEqual(nested.depth, 2)
+        self.assertLess(nested.path, second.path)
+        first.refresh_from_db()
+        self.assertEqual(first.path, first_path)
+
+    def test_depth_is_bounded(self):
+        """Ответ на самый глубокий уровень становится ему соседом."""
+        comment = self.root
+        for _ in range(COMMENT_MAX_DEPTH + 2):
+            comment = self.reply(comment)
+        self.assertEqual(comment.depth, COMMENT_MAX_DEPTH)
+        self.assertEqual(
+            Comment.objects.filter(post=self.post).order_by(
+                '-depth').first().depth,
+            COMMENT_MAX_DEPTH,
+        )
+
+    def test_reply_to_other_post_ignored(self):
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text='Чужой')
+        comment = self.reply(foreign)
+        self.assertIsNone(comment.parent)
+        self.assertEqual(comment.depth, 0)
+
+    def test_threads_on_post_page(self):
+        """Страница поста показывает первые ответы каждой ветки;
+        число запросов не зависит от числа веток."""
+        replies = [
+            self.reply(self.root, f'Ответ {number}')
+            for number in range(COMMENT_REPLIES_PER_PAGE + 2)
+        ]
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.logout()
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        root = response.context['comments'][0]
+        self.assertEqual(
+            root.thread_replies, replies[:COMMENT_REPLIES_PER_PAGE])
+        self.assertTrue(root.has_more_replies)
+
+        for number in range(3):
+            thread = Comment.objects.create(
+                post=self.post, author=self.user, text=f'Ветка {number}')
+            self.reply(thread)
+        self.client.logout()
+        cache.clear()
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_more_replies(self):
+        """Фрагмент ветки отдаёт ответы после последнего показанного."""
+        replies = [
+            self.reply(self.root, f'Ответ {number}')
+            for number in range(COMMENT_REPLIES_PER_PAGE + 2)
+        ]
+        shown = replies[COMMENT_REPLIES_PER_PAGE - 1]
+        response = self.client.get(
+            reverse(
+                'posts:comment_replies', args=[self.post.pk, self.root.pk]),
+            {'after': shown.path},
+        )
+        self.assertEqual(
+            response.context['comment'].thread_replies,
+            replies[COMMENT_REPLIES_PER_PAGE:],
+        )
+        self.assertFalse(response.context['comment'].has_more_replies)
+
+    def test_delete_removes_thread(self):
+        self.reply(self.reply(self.root))
+        self.root.delete()
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+
+
+class AutocompleteViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Alice')
+        User.objects.create_user(username='alina')
+        User.objects.create_user(username='bob')
+        Group.objects.create(title='Котики', slug='cats')
+        Group.objects.create(title='Кошки и кот', slug='kitties')
+
+    def setUp(self):
+        cache.clear()
+
+    def suggest(self, kind, query):
+        response = self.client.get(
+            reverse(f'posts:autocomplete_{kind}'), {'q': query})
+        return response.json()['results']
+
+    def test_users_by_prefix(self):
+        """Имена ищутся по началу без учёта регистра."""
+        self.assertEqual(
+            self.suggest('users', 'AL'),
+            [{'username': 'Alice'}, {'username': 'alina'}],
+        )
+        self.assertEqual(self.suggest('users', 'alic'), [
+            {'username': 'Alice'}])
+        self.assertEqual(self.suggest('users', ''), [])
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_users_follow_changes(self):
+        """Новые, переименованные и удалённые пользователи видны
+        в подсказках сразу."""
+        self.assertEqual(self.suggest('users', 'car'), [])
+        carol = User.objects.create_user(username='carol')
+        self.assertEqual(self.suggest('users', 'car'), [
+            {'username': 'carol'}])
+        carol.username = 'dave'
+        carol.save()
+        self.assertEqual(self.suggest('users', 'car'), [])
+        self.assertEqual(self.suggest('users', 'dav'), [
+            {'username': 'dave'}])
+        User.objects.filter(username='bob').delete()
+        self.assertEqual(self.suggest('users', 'b'), [])
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_rename_applied_without_rebuild(self):
+        """Переименование переносит одно имя, а не строит индекс
+        заново."""
+        self.suggest('users', 'a')
+        with mock.patch.object(
+            autocomplete.users, 'rebuild', side_effect=AssertionError
+        ):
+            user = User.objects.get(username='Alice')
+            user.username = 'Alison'
+            user.save()
+            self.assertEqual(self.suggest('users', 'ali'), [
+                {'username': 'alina'}, {'username': 'Alison'}])
+
+    def test_groups_by_title_and_slug(self):
+        """Группа находится по названию и по адресу, без повторов."""
+        self.assertEqual(
+            self.suggest('groups', 'ко'),
+            [
+                {'slug': 'cats', 'title': 'Котики'},
+                {'slug': 'kitties', 'title': 'Кошки и кот'},
+            ],
+        )
+        self.assertEqual(self.suggest('groups', 'cat'), [
+            {'slug': 'cats', 'title': 'Котики'}])
+        Group.objects.create(title='Собаки', slug='dogs')
+        self.assertEqual(self.suggest('groups', 'соб'), [
+            {'slug': 'dogs', 'title': 'Собаки'}])
+
+
+class FollowSuggestionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.other, cls.popular, cls.niche = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'other', 'popular', 'niche')
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.reader, author=cls.friend),
+            Follow(user=cls.reader, author=cls.other),
+            Follow(user=cls.friend, author=cls.popular),
+            Follow(user=cls.other, author=cls.popular),
+            Follow(user=cls.friend, author=cls.niche),
+            Follow(user=cls.friend, author=cls.reader),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot = os.path.join(directory.name, 'graph.bin')
+        settings = override_settings(FOLLOW_GRAPH_SNAPSHOT=self.snapshot)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        build_snapshot(self.snapshot)
+        # Свой граф на каждый тест: общий процессу граф остаётся пустым.
+        self.graph = GraphService()
+        patcher = mock.patch('posts.views.graph', self.graph)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.reader)
+
+    def suggested(self, url):
+        return [
+            (user, user.mutual_count)
+            for user in self.client.get(url).context['suggestions']
+        ]
+
+    def test_graph_overlay_and_compact(self):
+        """Изменения поверх CSR видны сразу и переживают сборку."""
+        graph = FollowGraph.from_edges([(1, 2), (1, 3), (3, 1)])
+        graph.follow(1, 4)
+        graph.unfollow(1, 2)
+        graph.follow(5, 1)
+        self.assertEqual(list(graph.following(1)), [3, 4])
+        graph.compact()
+        self.assertEqual(list(graph.following(1)), [3, 4])
+        self.assertEqual(list(graph.following(5)), [1])
+        self.assertEqual(list(graph.following(2)), [])
+        self.assertEqual(graph.added, {})
+
+    def test_suggestions_ranked_by_mutual_follows(self):
+        """Подсказки — друзья друзей по числу общих подписок, без
+        себя и уже прочитанных."""
+        self.assertEqual(
+            self.suggested(reverse('posts:follow_index')),
+            [(self.popular, 2), (self.niche, 1)],
+        )
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_follow_and_unfollow_update_suggestions(self):
+        """Подписки и отписки доходят до графа без его перестройки."""
+        profile = reverse('posts:profile', args=[self.niche.username])
+        self.assertEqual(
+            self.suggested(profile), [(self.popular, 2), (self.niche, 1)])
+        self.client.get(reverse(
+            'posts:profile_follow', args=[self.niche.username]))
+        self.assertEqual(self.suggested(profile), [(self.popular, 2)])
+        self.client.get(reverse(
+            'posts:profile_unfollow', args=[self.other.username]))
+        self.assertEqual(self.suggested(profile), [(self.popular, 1)])
+        self.assertEqual(self.graph.graph.changes, 2)
+
+    def test_no_suggestions_without_snapshot(self):
+        """Без снимка подсказок нет, и граф в запросе не строится."""
+        os.remove(self.snapshot)
+        service = GraphService()
+        with self.assertNumQueries(0):
+            self.assertEqual(service.suggest_users(self.reader), [])
+        self.assertIsNone(service.graph)
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_log_gap_does_not_rebuild(self):
+        """Потерянные записи журнала пропускаются без чтения Follow."""
+        service = GraphService()
+        service.get()
+        Follow.objects.create(user=self.reader, author=self.niche)
+        cache.delete(CHANGE_KEY.format('graph', service.applied + 1))
+        with self.assertNumQueries(0), self.assertLogs('posts.graph'):
+            graph = service.get()
+        self.assertEqual(
+            list(graph.following(self.reader.pk)),
+            [self.friend.pk, self.other.pk],
+        )
+        self.assertEqual(service.get(), graph)
+
+    @mock.patch('django.db.transaction.on_commit', run_at_once)
+    def test_new_snapshot_loaded(self):
+        """Процесс подхватывает новый снимок вместе с его номером."""
+        service = GraphService()
+        first = service.get()
+        Follow.objects.create(user=self.reader, author=self.niche)
+        build_snapshot(self.snapshot)
+        os.utime(self.snapshot, ns=(0, 0))
+        graph = service.get()
+        self.assertIsNot(graph, first)
+        self.assertEqual(graph.added, {})
+        self.assertIn(self.niche.pk, graph.following(self.reader.pk))
+
+    def test_anonymous_profile_has_no_suggestions(self):
+        self.client.logout()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.reader.username]))
+        self.assertEqual(response.context['suggestions'], [])
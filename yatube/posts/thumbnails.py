@@ -0,0 +1,242 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE,
+    KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore
+
+from . import caching
+from .constants import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, THUMBNAIL_WIDTHS
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def available_formats():
+    Image.init()
+    return [
+        image_format for image_format in THUMBNAIL_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+
+
+def get_variants(size):
+    """Варианты миниатюры size: (формат, ширина, геометрия, опции)."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    width, height = (int(side) for side in geometry.split('x'))
+    return [
+        (
+            image_format,
+            variant_width,
+            f'{variant_width}x{round(height * variant_width / width)}',
+            {**options, 'format': image_format},
+        )
+        for image_format in available_formats()
+        for variant_width in THUMBNAIL_WIDTHS
+        if variant_width <= width
+    ]
+
+
+def thumbnail_dimensions(post, size):
+    """Размеры самого широкого варианта миниатюры size для картинки поста.
+
+    Берутся из сохранённых размеров картинки, без обращения к файлу.
+    """
+    geometry, options = THUMBNAIL_SIZES[size]
+    box_width, box_height = (int(side) for side in geometry.split('x'))
+    if options.get('crop'):
+        return box_width, box_height
+    if not post.image_width or not post.image_height:
+        return None, None
+    scale = min(box_width / post.image_width, box_height / post.image_height)
+    if not options.get('upscale'):
+        scale = min(scale, 1)
+    return round(post.image_width * scale), round(post.image_height * scale)
+
+
+def all_geometries():
+    return [
+        (geometry, options)
+        for size in THUMBNAIL_SIZES
+        for _, _, geometry, options in get_variants(size)
+    ]
+
+
+class LookupThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который только ищет готовые миниатюры."""
+
+    def thumbnail_name(self, file_, geometry_string, **options):
+        """Имя файла миниатюры, которое построил бы get_thumbnail."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает миниатюру из хранилища ключей или None.
+
+        Если миниатюры поста уже загружены prefetch_thumbnails,
+        обращения к хранилищу не будет.
+        """
+        if not file_:
+            return None
+        name = self.thumbnail_name(file_, geometry_string, **options)
+        prefetched = getattr(
+            getattr(file_, 'instance', None), 'prefetched_thumbnails', {}
+        )
+        if name in prefetched:
+            return prefetched[name]
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupThumbnailBackend()
+
+
+def prefetch_thumbnails(posts, geometries=None):
+    """Загружает миниатюры всех постов одним get_many из кэша
+    и одним запросом к базе для промахов.
+
+    Результат кладётся в post.prefetched_thumbnails, откуда его берёт
+    get_ready_thumbnail.
+    """
+    store = default.kvstore
+    if not isinstance(store, CachedDBKVStore):
+        return
+    geometries = geometries or all_geometries()
+    wanted = {}
+    for post in posts:
+        if not post.image:
+            continue
+        post.prefetched_thumbnails = {}
+        for geometry, options in geometries:
+            name = backend.thumbnail_name(post.image, geometry, **options)
+            key = add_prefix(ImageFile(name, default.storage).key)
+            # Одна картинка может быть у нескольких постов.
+            wanted.setdefault(key, []).append((post, name))
+    if not wanted:
+        return
+
+    values = store.cache.get_many(list(wanted))
+    missing = [key for key in wanted if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        values.update(found)
+        store.cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+    for key, posts_names in wanted.items():
+        value = values.get(key)
+        thumbnail = (
+            deserialize_image_file(value)
+            if value and value != EMPTY_VALUE else None
+        )
+        for post, name in posts_names:
+            post.prefetched_thumbnails[name] = thumbnail
+
+
+def generate_thumbnails(name, force=False):
+    """Строит недостающие варианты миниатюр из THUMBNAIL_SIZES для
+    файла name; force перестраивает и уже готовые.
+
+    Если что-то построено, после коммита один раз сдвигаются поколение
+    лент и поколения постов с этой картинкой, чтобы страницы и блоки
+    лент с заглушкой перестроились. Возвращает True, если построена
+    хотя бы одна миниатюра.
+    """
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    created = False
+    for geometry, options in all_geometries():
+        thumbnail = ImageFile(
+            backend.thumbnail_name(source, geometry, **options),
+            default.storage,
+        )
+        if force:
+            default.kvstore.delete(thumbnail, delete_thumbnails=False)
+            thumbnail.delete()
+        elif default.kvstore.get(thumbnail) is not None:
+            continue
+        get_thumbnail(source, geometry, **options)
+        created = True
+    if created:
+        caching.bump_on_commit(caching.POSTS_SCOPE, *(
+            caching.post_scope(pk)
+            for pk in Post.objects.filter(image=name).values_list(
+                'pk', flat=True
+            )
+        ))
+    return created
+
+
+def build_thumbnails(name, force=False):
+    """То же, что generate_thumbnails, но ошибка только пишется в лог.
+
+    Возвращает True, если миниатюры построены.
+    """
+    try:
+        generate_thumbnails(name, force)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+        return False
+    return True
+
+
+def init_worker():
+    # Соединения с базой, унаследованные при fork, использовать нельзя.
+    connections.close_all()
+
+
+def run_in_worker(name, force=False):
+    try:
+        return build_thumbnails(name, force)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            initializer=init_worker,
+        )
+    return _executor
+
+
+def queue_thumbnails(image):
+    """Ставит построение миниатюр в очередь после коммита транзакции.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюры строятся сразу.
+    """
+    if not image:
+        return
+    name = image.name
+
+    def submit():
+        if settings.POSTS_THUMBNAIL_WORKERS:
+            get_executor().submit(run_in_worker, name)
+        else:
+            build_thumbnails(name)
+
+    transaction.on_commit(submit)
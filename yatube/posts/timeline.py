@@ -0,0 +1,187 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .constants import TIMELINE_BATCH_SIZE
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import CursorPaginator, EntryCursorPaginator, as_plain_page
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def is_pulled(author_id):
+    """Посты автора с большим числом подписчиков не раскладываются
+    по лентам, а подмешиваются при чтении."""
+    return followers_count(author_id) > settings.FEED_FANOUT_LIMIT
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются на лету."""
+    return list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).order_by().values_list('author_id', flat=True))
+
+
+def push_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту читателя все посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.iterator()
+        ),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты читателя посты автора.
+
+    Если после отписки автор опустился до порога, его посты снова
+    раскладываются по лентам оставшихся подписчиков — в фоне, после
+    коммита транзакции.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    if followers_count(author_id) == settings.FEED_FANOUT_LIMIT:
+        queue_push_author(author_id)
+
+
+def push_author(author_id):
+    """Раскладывает все посты автора по лентам его подписчиков.
+
+    Подписчики читаются по id пачками так, чтобы в пачке было около
+    TIMELINE_BATCH_SIZE строк ленты, и каждая пачка пишется в своей
+    транзакции. Если автор снова перешёл порог, раскладка прекращается.
+    """
+    posts = list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date'))
+    if not posts:
+        return
+    per_batch = max(1, TIMELINE_BATCH_SIZE // len(posts))
+    last_user_id = 0
+    while not is_pulled(author_id):
+        followers = list(Follow.objects.filter(
+            author_id=author_id, user_id__gt=last_user_id
+        ).order_by('user_id').values_list('user_id', flat=True)[:per_batch])
+        if not followers:
+            return
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for user_id in followers
+                for pk, pub_date in posts
+            ),
+            batch_size=TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        last_user_id = followers[-1]
+
+
+def run_in_background(author_id):
+    try:
+        push_author(author_id)
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_FANOUT_WORKERS
+        )
+    return _executor
+
+
+def queue_push_author(author_id):
+    """Ставит раскладку постов автора в очередь после коммита.
+
+    При FEED_FANOUT_WORKERS = 0 посты раскладываются сразу после
+    коммита в том же процессе.
+    """
+    def submit():
+        if settings.FEED_FANOUT_WORKERS:
+            get_executor().submit(run_in_background, author_id)
+        else:
+            push_author(author_id)
+
+    transaction.on_commit(submit)
+
+
+class TimelinePaginator(EntryCursorPaginator):
+    """Лента подписок по курсору.
+
+    Разложенные посты — одно диапазонное чтение индекса ленты
+    (user, pub_date, post). Посты авторов выше порога читаются
+    по индексу (author, pub_date) отдельно для каждого, и к странице
+    идут первые per_page + 1 из слияния всех чтений.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(TimelineEntry.objects.filter(user=user), per_page)
+        self.pulled = [
+            CursorPaginator(
+                Post.objects.filter(
+                    author_id=author_id
+                ).select_related('author', 'group'),
+                per_page,
+            )
+            for author_id in pulled_authors(user)
+        ]
+
+    def read(self, cursor, newer=False):
+        items = super().read(cursor, newer)
+        if not self.pulled:
+            return items
+        for paginator in self.pulled:
+            items.extend(paginator.read(cursor, newer))
+        # Пост может быть и в ленте, если автор перешёл порог недавно.
+        unique = {post.pk: post for post in items}
+        return sorted(
+            unique.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not newer,
+        )[:self.per_page + 1]
+
+    def make_page(self, items, has_previous, has_next):
+        return as_plain_page(
+            super().make_page(items, has_previous, has_next)
+        )
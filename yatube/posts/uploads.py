@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше
+    POSTS_IMAGE_MAX_BYTES.
+
+    Остаток слишком большого файла отбрасывается, не доходя до диска,
+    а в size остаётся настоящий размер: по нему validate_image
+    отклонит файл.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        limit = settings.POSTS_IMAGE_MAX_BYTES
+        if start < limit:
+            self.file.write(raw_data[:limit - start])
@@ -7,10 +7,33 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_list'),
+    path('tags/', views.trending_tags, name='trending_tags'),
+    path('search/', views.search, name='search'),
+    path(
+        'autocomplete/users/',
+        views.autocomplete_users,
+        name='autocomplete_users'
+    ),
+    path(
+        'autocomplete/groups/',
+        views.autocomplete_groups,
+        name='autocomplete_groups'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path(
+        'posts/<int:post_id>/comments/<int:comment_id>/replies/',
+        views.comment_replies,
+        name='comment_replies'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
@@ -1,31 +1,128 @@
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
-
-from .models import Group, Post, User, Follow
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.http import urlencode
+
+from . import autocomplete
+from .comments import attach_replies, get_replies
+from .models import Comment, Group, Post, PostTag, Tag, User, Follow
+from .caching import (
+    POSTS_SCOPE,
+    cache_anonymous_page,
+    conditional_page,
+    follow_scope,
+    get_cache_context,
+    post_scope,
+    profile_scope,
+)
+from .constants import AMOUNT_PUBLICATION
 from .forms import PostForm, CommentForm
-from .utils import get_page_context
-
-
+from .graph import graph
+from .search import SearchPaginator, decode_search_cursor
+from .stats import get_stats
+from .tags import trending
+from .thumbnails import queue_thumbnails
+from .timeline import TimelinePaginator
+from .utils import (
+    EntryCursorPaginator,
+    get_comments_page,
+    get_cursor_context,
+    get_page_context,
+)
+
+
+@conditional_page(POSTS_SCOPE)
+@cache_anonymous_page(POSTS_SCOPE)
 def index(request):
     """Выводит шаблон главной страницы."""
-    context = get_page_context(request, Post.objects.all())
+    context = get_page_context(
+        request, Post.objects.select_related('author', 'group'), keyset=True
+    )
+    context.update(get_cache_context())
 
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(POSTS_SCOPE)
+@cache_anonymous_page(POSTS_SCOPE)
 def group_posts(request, slug):
     """Выводит шаблон с группами постов"""
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
     context = {
         'group': group,
-        'posts': posts,
     }
-    context.update(get_page_context(request, group.posts.all()))
+    context.update(get_page_context(request, posts, keyset=True))
+    context.update(get_cache_context())
 
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(POSTS_SCOPE)
+@cache_anonymous_page(POSTS_SCOPE)
+def tag_posts(request, name):
+    """Выводит ленту постов с тегом."""
+    tag = get_object_or_404(Tag, name=name.lower())
+    # Страницы читаются по строкам индекса тегов (tag, pub_date, post)
+    # без соединения с постами в фильтре курсора.
+    context = {
+        'tag': tag,
+    }
+    context.update(get_cursor_context(request, EntryCursorPaginator(
+        PostTag.objects.filter(tag=tag), AMOUNT_PUBLICATION
+    )))
+    context.update(get_cache_context())
+
+    return render(request, 'posts/tag_list.html', context)
+
+
+@cache_anonymous_page(POSTS_SCOPE)
+def trending_tags(request):
+    """Выводит теги, популярные за последние часы."""
+    return render(request, 'posts/trending_tags.html', {
+        'tags': trending(),
+    })
+
+
+@conditional_page(POSTS_SCOPE)
+def search(request):
+    """Выводит результаты полнотекстового поиска по постам.
+
+    Страницы поиска не кладутся в кэш анонимных страниц: запросы
+    слишком разные и только вытесняли бы ленты.
+    """
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        paginator = SearchPaginator(query, AMOUNT_PUBLICATION)
+        context['page_obj'] = paginator.get_cursor_page(
+            decode_search_cursor(request.GET.get('after', '')),
+            decode_search_cursor(request.GET.get('before', '')),
+        )
+        context['page_params'] = urlencode({'q': query}) + '&'
+
+    return render(request, 'posts/search.html', context)
+
+
+def autocomplete_users(request):
+    """Подсказки имён пользователей по началу имени в JSON."""
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({
+        'results': autocomplete.users.search(query) if query else [],
+    })
+
+
+def autocomplete_groups(request):
+    """Подсказки групп по началу названия или адреса в JSON."""
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({
+        'results': autocomplete.groups.search(query) if query else [],
+    })
+
+
+@conditional_page(POSTS_SCOPE, profile_scope)
+@cache_anonymous_page(POSTS_SCOPE, profile_scope)
 def profile(request, username):
     """Выводит шаблон профайла пользователя"""
     author = get_object_or_404(User, username=username)
@@ -37,18 +134,31 @@ def profile(request, username):
         following = False
     context = {
         'author': author,
+        'stats': get_stats(author),
         'following': following,
+        'suggestions': (
+            graph.suggest_users(request.user)
+            if request.user.is_authenticated else []
+        ),
     }
-    context.update(get_page_context(request, author.posts.all()))
+    context.update(get_page_context(
+        request, author.posts.select_related('group'), keyset=True
+    ))
+    context.update(get_cache_context())
 
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(POSTS_SCOPE, post_scope)
+@cache_anonymous_page(POSTS_SCOPE, post_scope)
 def post_detail(request, post_id):
     """Выводит шаблон страницы поста."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(post)
+    attach_replies(comments)
 
     if form.is_valid():
         form = form.save(commit=False)
@@ -57,6 +167,7 @@ def post_detail(request, post_id):
 
     context = {
         'post': post,
+        'stats': get_stats(post.author),
         'form': form,
         'comments': comments,
     }
@@ -64,6 +175,32 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context, post_id)
 
 
+@conditional_page(post_scope)
+@cache_anonymous_page(post_scope)
+def post_comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_comments_page(post, request.GET.get('after', ''))
+    attach_replies(comments)
+    return render(request, 'posts/includes/comments_list.html', {
+        'post': post,
+        'comments': comments,
+    })
+
+
+@conditional_page(post_scope)
+@cache_anonymous_page(post_scope)
+def comment_replies(request, post_id, comment_id):
+    """Следующие ответы ветки для кнопки «Показать ещё ответы»."""
+    comment = get_object_or_404(Comment, pk=comment_id, post_id=post_id)
+    comment.thread_replies, comment.has_more_replies = get_replies(
+        comment, request.GET.get('after', '')
+    )
+    return render(request, 'posts/includes/comment_replies.html', {
+        'comment': comment,
+    })
+
+
 @login_required
 def add_comment(request, post_id):
     """Обрабатывает создания поста."""
@@ -73,7 +210,13 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent = Comment.objects.filter(
+                pk=parent_id, post=post
+            ).first()
+        with transaction.atomic():
+            comment.save()
 
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -89,6 +232,7 @@ def post_create(request):
         form_post = form_post.save(commit=False)
         form_post.author = request.user
         form_post.save()
+        queue_thumbnails(form_post.image)
 
         return redirect('posts:profile', request.user.username)
     context = {
@@ -111,7 +255,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post.image)
 
         return redirect('posts:post_detail', post_id=post.id)
 
@@ -125,10 +271,15 @@ def post_edit(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    page_context = get_page_context(request, posts_list)
+    context = get_cursor_context(
+        request, TimelinePaginator(request.user, AMOUNT_PUBLICATION)
+    )
+    context['suggestions'] = graph.suggest_users(request.user)
+    context.update(get_cache_context(
+        POSTS_SCOPE, follow_scope(request.user.pk)
+    ))
 
-    return render(request, 'posts/follow.html', page_context)
+    return render(request, 'posts/follow.html', context)
 
 
 @login_required
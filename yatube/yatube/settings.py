@@ -113,9 +113,47 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки сразу пишутся во временный файл, а не собираются в памяти,
+# и на диск попадает не больше POSTS_IMAGE_MAX_BYTES.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+]
 
+# Файловый кэш на SQLite общий для всех процессов на хосте, поэтому
+# сброс кэша в одном процессе виден остальным.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+# Тесты получают свой файл кэша во временном каталоге.
+TEST_RUNNER = 'core.test_runner.TempCacheRunner'
+
+# Авторы, у которых подписчиков больше порога, не раскладывают посты
+# по лентам при публикации: их посты подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 10000
+# Когда автор опускается до порога, его посты снова раскладываются
+# по лентам в фоновых потоках; 0 — сразу после коммита в том же запросе.
+FEED_FANOUT_WORKERS = 1
+
+# Снимок графа подписок для «кого почитать». Его строит по расписанию
+# команда build_follow_graph, а процессы сайта только загружают.
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(BASE_DIR, 'follow_graph.bin')
+
+# Миниатюры картинок постов строятся в фоновых процессах сразу после
+# загрузки; 0 — строить их синхронно в том же запросе.
+POSTS_THUMBNAIL_WORKERS = 2
+# Заглушка из static, которая показывается, пока миниатюра не готова.
+POSTS_THUMBNAIL_PLACEHOLDER = 'img/placeholder.svg'
+# Ограничения на картинки постов. Число пикселей проверяется
+# по заголовку файла, до того как картинка будет раскодирована.
+POSTS_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+# При загрузке картинка уменьшается до этого размера по большей стороне
+# и пережимается в JPEG с этим качеством.
+POSTS_IMAGE_MAX_DIMENSION = 2560
+POSTS_IMAGE_QUALITY = 85